@@ -241,8 +241,8 @@ enable_gpu_flags() {
     local vendor="$1"
     case "$vendor" in
         intel) for m in render video freq power; do sed -i "s/intel_gpu_${m} = False/intel_gpu_${m} = True/" src/config.py; done ;;
-        nvidia) for m in util mem freq power temp; do sed -i "s/nvidia_gpu_${m} = False/nvidia_gpu_${m} = True/" src/config.py; done ;;
-        amd) for m in util mem freq power temp; do sed -i "s/amd_gpu_${m} = False/amd_gpu_${m} = True/" src/config.py; done ;;
+        nvidia) for m in util mem freq power temp enc dec pcie_tx pcie_rx; do sed -i "s/nvidia_gpu_${m} = False/nvidia_gpu_${m} = True/" src/config.py; done ;;
+        amd) for m in util mem freq power temp temp_junction temp_mem vram_used fan power_cap; do sed -i "s/amd_gpu_${m} = False/amd_gpu_${m} = True/" src/config.py; done ;;
     esac
 }
 
@@ -0,0 +1,267 @@
+"""Built-in benchmark for rpi-mqtt-monitor.
+
+Launched via `rpi-mqtt-monitor --benchmark [FILE]`. Measures what one cycle
+costs on this machine:
+
+* every collector from build_collectors(), run on its own several times, with
+  the number of processes it spawns per run;
+* config_json() for every published entity and build_device_info();
+* a full _publish_to_mqtt() against a local stand-in broker, both cold (every
+  discovery config sent) and warm (discovery already cached).
+
+Results are printed as a table and written as JSON so runs can be compared
+across releases and hardware.
+"""
+
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import paho.mqtt.client as paho
+
+# How many times each measurement is repeated; the table reports min/median/max.
+ROUNDS = 3
+
+# MQTT control packet types (high nibble of the fixed header byte).
+CONNECT, PUBLISH, PUBREL, SUBSCRIBE, PINGREQ, DISCONNECT = 1, 3, 6, 8, 12, 14
+
+
+class StandInBroker:
+    """Minimal MQTT 3.1.1 broker on 127.0.0.1: accepts one client at a time,
+    acknowledges everything and counts the PUBLISH packets and bytes it receives.
+    Nothing is stored or forwarded."""
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.messages = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._serve, name="benchmark-broker", daemon=True).start()
+
+    def counters(self):
+        with self.lock:
+            return self.messages, self.bytes
+
+    def wait_idle(self, quiet=0.2, max_wait=5):
+        """Return counters() once nothing has arrived for `quiet` seconds."""
+        deadline = time.monotonic() + max_wait
+        last = self.counters()
+        while time.monotonic() < deadline:
+            time.sleep(quiet)
+            now = self.counters()
+            if now == last:
+                break
+            last = now
+        return last
+
+    def close(self):
+        self.server.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read_exactly(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _read_packet(self, conn):
+        header = self._read_exactly(conn, 1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self._read_exactly(conn, 1)[0]
+            length |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, self._read_exactly(conn, length)
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                while True:
+                    header, body = self._read_packet(conn)
+                    kind = header >> 4
+                    if kind == CONNECT:
+                        conn.sendall(b"\x20\x02\x00\x00")
+                    elif kind == PUBLISH:
+                        with self.lock:
+                            self.messages += 1
+                            self.bytes += len(body)
+                        qos = (header >> 1) & 3
+                        if qos:
+                            topic_length = int.from_bytes(body[:2], "big")
+                            packet_id = body[2 + topic_length:4 + topic_length]
+                            conn.sendall((b"\x40\x02" if qos == 1 else b"\x50\x02") + packet_id)
+                    elif kind == PUBREL:
+                        conn.sendall(b"\x70\x02" + body[:2])
+                    elif kind == SUBSCRIBE:
+                        topics = 0
+                        i = 2
+                        while i < len(body):
+                            i += 2 + int.from_bytes(body[i:i + 2], "big") + 1
+                            topics += 1
+                        conn.sendall(bytes([0x90, 2 + topics]) + body[:2] + b"\x00" * topics)
+                    elif kind == PINGREQ:
+                        conn.sendall(b"\xd0\x00")
+                    elif kind == DISCONNECT:
+                        return
+            except (ConnectionError, OSError):
+                return
+
+
+def _timed(func, rounds=ROUNDS):
+    """Run func rounds times; return (timings in ms, last result). Rounds are
+    a few clock ticks apart so /proc/stat based collectors see some elapsed
+    time (the first cpu_load round is the one-second first-reading sample)."""
+    timings, result = [], None
+    for i in range(rounds):
+        if i:
+            time.sleep(0.05)
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def _summary(timings):
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def bench_collectors(monitor):
+    """Time every collector on its own (not in the worker pool), so each figure
+    is what that collector costs, not how long it waited for a slot."""
+    results, monitored_values = {}, {}
+    for collector in monitor.build_collectors():
+        monitor.spawn_count(reset=True)
+        try:
+            timings, fragment = _timed(collector.func)
+        except Exception as e:
+            print("Error in collector {}: {}".format(collector.name, e))
+            results[collector.name] = {"error": str(e)}
+            monitored_values.update(collector.fallback)
+            continue
+        results[collector.name] = dict(_summary(timings), spawns=monitor.spawn_count() / ROUNDS)
+        monitored_values.update(fragment)
+    return results, monitored_values
+
+
+def bench_discovery(monitor, monitored_values):
+    entities = list(monitor.iter_entities(monitored_values))
+
+    def config_json_all():
+        for entity in entities:
+            monitor.config_json(entity.what_config, entity.device)
+
+    results = {
+        "build_device_info": _summary(_timed(monitor.build_device_info)[0]),
+        "config_json": dict(_summary(_timed(config_json_all)[0]), entities=len(entities)),
+    }
+    return results
+
+
+def bench_publish(monitor, monitored_values):
+    """Time _publish_to_mqtt(), including the wait for delivery, against a
+    StandInBroker. "cold" clears the discovery cache and publish filter first,
+    like the first cycle after start; "warm" is a steady-state cycle."""
+    broker = StandInBroker()
+    client = paho.Client(client_id="rpi-mqtt-monitor-benchmark")
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    results = {}
+    try:
+        if not monitor.wait_for_mqtt_connection(client):
+            print("Error: could not connect to the stand-in broker")
+            return results
+        for name, cold in (("cold", True), ("warm", False)):
+            timings, messages, sent = [], 0, 0
+            for _ in range(ROUNDS):
+                if cold:
+                    monitor.reset_discovery_cache()
+                    monitor.reset_publish_filter()
+                before = broker.wait_idle()
+                started = time.perf_counter()
+                with monitor.delivery_tracking():
+                    monitor._publish_to_mqtt(client, monitored_values)
+                timings.append((time.perf_counter() - started) * 1000)
+                after = broker.wait_idle()
+                messages, sent = after[0] - before[0], after[1] - before[1]
+            results[name] = dict(_summary(timings), messages=messages, bytes=sent)
+    finally:
+        client.disconnect()
+        client.loop_stop()
+        broker.close()
+    return results
+
+
+def print_table(report):
+    rows = [("Collector", "min ms", "median ms", "max ms", "spawns")]
+    for name, result in report["collectors"].items():
+        if "error" in result:
+            rows.append((name, "error", "", "", ""))
+        else:
+            rows.append((name, "%.2f" % result["min_ms"], "%.2f" % result["median_ms"],
+                         "%.2f" % result["max_ms"], "%g" % result["spawns"]))
+    for name, result in report["discovery"].items():
+        label = name + (" (%d entities)" % result["entities"] if "entities" in result else "")
+        rows.append((label, "%.2f" % result["min_ms"], "%.2f" % result["median_ms"], "%.2f" % result["max_ms"], ""))
+    for name, result in report["publish"].items():
+        rows.append(("publish %s (%d msgs, %d B)" % (name, result["messages"], result["bytes"]),
+                     "%.2f" % result["min_ms"], "%.2f" % result["median_ms"], "%.2f" % result["max_ms"], ""))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for i, row in enumerate(rows):
+        print("  ".join(cell.ljust(widths[0]) if j == 0 else cell.rjust(widths[j]) for j, cell in enumerate(row)))
+        if i == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+def run(monitor, json_path):
+    """Benchmark the monitor module, print a table and write the report to
+    json_path ("-" prints it to stdout instead)."""
+    facts = monitor.device_facts()
+    collectors, monitored_values = bench_collectors(monitor)
+    report = {
+        "version": monitor.config.version,
+        "hostname": monitor.hostname,
+        "model": facts["model"],
+        "os": facts["os"],
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "rounds": ROUNDS,
+        "collectors": collectors,
+        "discovery": bench_discovery(monitor, monitored_values),
+        "publish": bench_publish(monitor, monitored_values),
+    }
+    print_table(report)
+    if json_path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print("\nReport written to " + os.path.abspath(json_path))
+    return report
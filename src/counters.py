@@ -0,0 +1,55 @@
+"""Rates from monotonic kernel counters for rpi-mqtt-monitor.
+
+The disk I/O and network rate sensors read cumulative counters from /proc
+and report how much they grew since the previous reading. A counter only
+goes down when it wraps at its width or when it is reset (driver reload,
+interface re-plug, reboot); the two are told apart by the counter's width,
+which CounterSampler is given per field.
+"""
+
+import platform
+import threading
+import time
+
+# Width of the kernel's unsigned long, which most /proc counters are:
+# 64 bits on a 64-bit kernel (also under a 32-bit userland), 32 otherwise.
+LONG_BITS = 64 if platform.machine().endswith("64") else 32
+
+
+def counter_delta(before, after, bits=LONG_BITS):
+    """Increase of a bits-wide kernel counter between two readings. A 32-bit
+    counter that went down from the top half of its range wrapped; any other
+    decrease is a reset, and counts as no increase rather than a spike. A
+    64-bit counter does not wrap in practice, so every decrease is a reset."""
+    if after >= before:
+        return after - before
+    if bits == 32 and 2 ** 31 <= before < 2 ** 32:
+        return after + 2 ** 32 - before
+    return 0
+
+
+class CounterSampler:
+    """Deltas of a set of kernel counters between calls, for rate sensors.
+    read() returns {name: (counter, ...)} and widths gives the bit width of
+    each field; deltas() returns the seconds since the previous call and
+    {name: (delta, ...)}. The first call has nothing to compare with, so it
+    samples over one second."""
+
+    def __init__(self, read, widths):
+        self._read = read
+        self._widths = widths
+        self._lock = threading.Lock()
+        self._last = None
+
+    def deltas(self):
+        with self._lock:
+            before, self._last = self._last, (time.monotonic(), self._read())
+        if before is None:
+            time.sleep(1)
+            with self._lock:
+                before, self._last = self._last, (time.monotonic(), self._read())
+        after = self._last
+        deltas = {name: tuple(counter_delta(b, a, bits) for b, a, bits in zip(before[1][name], counters, self._widths))
+                  for name, counters in after[1].items() if name in before[1]}
+        return after[0] - before[0], deltas
+
@@ -0,0 +1,113 @@
+"""Prometheus / OpenMetrics endpoint for rpi-mqtt-monitor.
+
+Enabled with `prometheus_exporter = True` in --service mode. The service
+renders the exposition text once per cycle from the readings it just
+collected and hands it to MetricsServer.update(); a scrape only copies those
+bytes to the socket, so it never runs a collector and costs the same however
+often Prometheus polls.
+
+The text follows OpenMetrics (counters end in _total, the body ends with
+# EOF) and is also accepted by Prometheus' classic text parser, so the same
+bytes are served for either Accept header.
+"""
+
+import math
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_INVALID_NAME = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def metric_name(name):
+    name = _INVALID_NAME.sub('_', name)
+    return "_" + name if name[:1].isdigit() else name
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(families):
+    """OpenMetrics text for {name: (type, help, [(labels, value), ...])}.
+    type is "gauge" or "counter" (samples get the _total suffix); numeric
+    strings (the vcgencmd voltage, sysfs fan speed, SHT21 readings) are
+    converted, samples whose value is not a number are left out, and so are
+    families without any."""
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        rendered = []
+        sample_name = name + "_total" if kind == "counter" else name
+        for labels, value in samples:
+            if isinstance(value, str):
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+            elif not isinstance(value, (int, float)):
+                continue
+            if labels:
+                label_text = ",".join('{}="{}"'.format(key, _label_value(val)) for key, val in labels.items())
+                rendered.append("{}{{{}}} {}".format(sample_name, label_text, _number(value)))
+            else:
+                rendered.append("{} {}".format(sample_name, _number(value)))
+        if rendered:
+            lines.append("# TYPE {} {}".format(name, kind))
+            if help_text:
+                lines.append("# HELP {} {}".format(name, help_text.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.extend(rendered)
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP server answering GET /metrics with the text of the last update()."""
+
+    def __init__(self, address, port):
+        self.body = b"# EOF\n"
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = server.body
+                accept = self.headers.get("Accept", "")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_TYPE if "application/openmetrics-text" in accept else TEXT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((address, int(port)), Handler)
+        self.httpd.daemon_threads = True
+
+    def update(self, text):
+        self.body = text.encode("utf-8")
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
@@ -0,0 +1,166 @@
+"""Local time-series history for rpi-mqtt-monitor.
+
+Enabled with `history = True`. Every cycle the numeric readings are folded
+into one fixed-size, memory-mapped ring file per metric holding three
+resolutions: one-minute buckets for the last day, one-hour buckets for the
+last 30 days and one-day buckets for the last year. `rpi-mqtt-monitor -d`
+reads them to draw sparklines with min/avg/max, without a broker or network.
+
+A bucket is five doubles: start time, sample count, sum, min and max. The
+bucket starting at t lives in slot (t // resolution) % slots of its tier, so
+there is no head pointer to keep consistent: a slot holding another start
+time is stale and is reset the first time it is written again.
+"""
+
+import math
+import mmap
+import os
+import re
+import time
+
+# (name, seconds per bucket, buckets kept)
+TIERS = (("1m", 60, 1440), ("1h", 3600, 720), ("1d", 86400, 366))
+FIELDS = 5  # start, count, sum, min, max
+RING_SIZE = sum(slots for _, _, slots in TIERS) * FIELDS * 8
+
+# metric names become file names
+METRIC_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class MetricRing:
+    """One metric's buckets, an mmap of a RING_SIZE file viewed as doubles."""
+
+    def __init__(self, path, writable=True):
+        if writable:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(fd).st_size != RING_SIZE:
+                # new file, or one from another layout: start over with zeros
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, RING_SIZE)
+        else:
+            fd = os.open(path, os.O_RDONLY)
+            if os.fstat(fd).st_size != RING_SIZE:
+                os.close(fd)
+                raise ValueError("{} is not a history ring".format(path))
+        try:
+            self.mm = mmap.mmap(fd, RING_SIZE, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self.data = memoryview(self.mm).cast('d')
+
+    def close(self):
+        self.data.release()
+        self.mm.close()
+
+    @staticmethod
+    def _slot(tier, start):
+        offset = 0
+        for name, resolution, slots in TIERS:
+            if name == tier:
+                return offset + int(start // resolution % slots) * FIELDS
+            offset += slots * FIELDS
+        raise KeyError(tier)
+
+    def add(self, value, now):
+        data = self.data
+        for tier, resolution, _ in TIERS:
+            start = now // resolution * resolution
+            i = self._slot(tier, start)
+            if data[i] != start:
+                data[i], data[i + 1], data[i + 2], data[i + 3], data[i + 4] = start, 1, value, value, value
+            else:
+                data[i + 1] += 1
+                data[i + 2] += value
+                data[i + 3] = min(data[i + 3], value)
+                data[i + 4] = max(data[i + 4], value)
+
+    def buckets(self, tier, count, now):
+        """The last count buckets of tier up to the current one, oldest first:
+        (avg, min, max, samples), or None where nothing was recorded."""
+        resolution = dict((name, res) for name, res, _ in TIERS)[tier]
+        current = now // resolution * resolution
+        data = self.data
+        result = []
+        for n in range(count - 1, -1, -1):
+            start = current - n * resolution
+            i = self._slot(tier, start)
+            if data[i] == start and data[i + 1] > 0:
+                result.append((data[i + 2] / data[i + 1], data[i + 3], data[i + 4], data[i + 1]))
+            else:
+                result.append(None)
+        return result
+
+
+class History:
+    """The ring files of every metric in a directory."""
+
+    def __init__(self, directory, writable=True):
+        self.directory = directory
+        self.writable = writable
+        self.rings = {}
+        if writable:
+            os.makedirs(directory, mode=0o755, exist_ok=True)
+
+    def _ring(self, metric):
+        ring = self.rings.get(metric)
+        if ring is None:
+            ring = self.rings[metric] = MetricRing(os.path.join(self.directory, metric + ".ring"), self.writable)
+        return ring
+
+    def record(self, values, now=None):
+        """Add every finite number in {metric: value}, including numeric strings
+        such as the vcgencmd voltage; other values are skipped."""
+        now = time.time() if now is None else now
+        for metric, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            if math.isfinite(value) and METRIC_RE.match(metric):
+                self._ring(metric).add(value, now)
+
+    def has(self, metric):
+        return metric in self.rings or (METRIC_RE.match(metric) is not None and
+                                        os.path.exists(os.path.join(self.directory, metric + ".ring")))
+
+    def buckets(self, metric, tier, count, now=None):
+        """MetricRing.buckets() of metric, or None when it has no history."""
+        if not self.has(metric):
+            return None
+        try:
+            ring = self._ring(metric)
+        except (OSError, ValueError):
+            return None
+        return ring.buckets(tier, count, time.time() if now is None else now)
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(buckets):
+    """One character per bucket, scaled between the lowest and highest average;
+    a space where the bucket is empty."""
+    averages = [b[0] for b in buckets if b is not None]
+    if not averages:
+        return " " * len(buckets)
+    low, high = min(averages), max(averages)
+    span = (high - low) or 1
+    top = len(SPARK_CHARS) - 1
+    return "".join(" " if b is None else SPARK_CHARS[round((b[0] - low) / span * top)] for b in buckets)
+
+
+def summary(buckets):
+    """(min, avg, max) over the samples of the non-empty buckets, or None."""
+    filled = [b for b in buckets if b is not None]
+    if not filled:
+        return None
+    samples = sum(b[3] for b in filled)
+    return (min(b[1] for b in filled), sum(b[0] * b[3] for b in filled) / samples, max(b[2] for b in filled))
+
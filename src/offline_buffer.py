@@ -0,0 +1,86 @@
+"""Offline store-and-forward buffer for rpi-mqtt-monitor.
+
+Enabled with `offline_buffer = True`. When the MQTT broker cannot be reached,
+the readings of that cycle are written to a small SQLite database instead of
+being dropped. Once the broker is back they are replayed oldest first, each
+with the time it was measured, at a capped rate so a long outage does not
+flood the broker or the uplink.
+
+The database holds at most max_rows snapshots; when it is full the oldest are
+discarded, so an outage of any length costs a bounded amount of disk.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class OfflineBuffer:
+    """Bounded FIFO of (timestamp, readings) snapshots in an SQLite file."""
+
+    def __init__(self, path, max_rows=10000):
+        self.path = path
+        self.max_rows = max(1, int(max_rows))
+        self.lock = threading.Lock()
+        # autocommit: every store/delete is its own small transaction
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL with synchronous=NORMAL keeps the writes per snapshot low on SD cards
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS snapshots ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "timestamp REAL NOT NULL, "
+                        "readings TEXT NOT NULL)")
+
+    def store(self, readings, timestamp=None):
+        """Append a {key: value} snapshot, dropping the oldest beyond max_rows."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            cursor = self.db.execute("INSERT INTO snapshots (timestamp, readings) VALUES (?, ?)",
+                                     (timestamp, json.dumps(readings, default=str)))
+            self.db.execute("DELETE FROM snapshots WHERE id <= ?", (cursor.lastrowid - self.max_rows,))
+
+    def pending(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def oldest(self, limit):
+        """Up to limit (id, payload) pairs, oldest first. The payload is the
+        JSON message replayed: {"timestamp": ISO 8601 UTC, "values": {...}}."""
+        with self.lock:
+            rows = self.db.execute("SELECT id, timestamp, readings FROM snapshots ORDER BY id LIMIT ?",
+                                   (limit,)).fetchall()
+        return [(row_id, '{"timestamp": %s, "values": %s}' % (
+                    json.dumps(datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")), readings))
+                for row_id, timestamp, readings in rows]
+
+    def delete(self, ids):
+        if ids:
+            with self.lock:
+                self.db.executemany("DELETE FROM snapshots WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def replay(self, deliver, rate=10, stop=None, max_time=None):
+        """Hand the buffered payloads to deliver(payloads) in batches of rate per
+        second, oldest first. deliver returns how many of them (from the start
+        of the list) the broker has accepted; those are removed. Stops when the
+        buffer is empty, a batch is not fully delivered, stop() is true or
+        max_time seconds have passed. Returns the number of snapshots replayed."""
+        rate = max(1, int(rate))
+        started = time.monotonic()
+        replayed = 0
+        while not (stop and stop()):
+            if max_time is not None and time.monotonic() - started >= max_time:
+                break
+            batch = self.oldest(rate)
+            if not batch:
+                break
+            batch_started = time.monotonic()
+            delivered = deliver([payload for _, payload in batch])
+            self.delete([row_id for row_id, _ in batch[:delivered]])
+            replayed += delivered
+            if delivered < len(batch) or len(batch) < rate:
+                break
+            time.sleep(max(0, 1 - (time.monotonic() - batch_started)))
+        return replayed
@@ -13,14 +13,26 @@ import math
 import os
 import sys
 import shutil
+import signal
 import argparse
+import asyncio
+import atexit
+import collections
+import contextlib
 import threading
 import update
 import config
+import history as history_module
+import exporter
+import counters
 import re
 import html
 import uuid
 import glob
+import fnmatch
+import random
+import select
+import hashlib
 import requests
 import configparser
 import psutil
@@ -40,23 +52,138 @@ def get_translation(key):
     return configlanguage.get(config.language, key, fallback=key)
 
 
-def check_wifi_signal(format):
-    try:
-        full_cmd =  "ls /sys/class/ieee80211/*/device/net/"
-        interface = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0].strip().decode("utf-8")
-        full_cmd = "/sbin/iwconfig {} | grep -i quality".format(interface)
-        wifi_signal = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).communicate()[0]
+# Processes launched by the monitor (subprocess, os.system, os.posix_spawn, ...),
+# counted through the interpreter's audit hooks so no call site can be missed.
+# A shell pipeline counts as one launch. Reset at the start of every cycle.
+_SPAWN_EVENTS = {"subprocess.Popen", "os.system", "os.posix_spawn", "os.spawn", "os.exec", "os.fork"}
+_spawn_lock = threading.Lock()
+_spawn_count = 0
 
-        if format == 'dbm':
-            wifi_signal = wifi_signal.decode("utf-8").strip().split(' ')[4].split('=')[1]
-        else:
-            wifi_signal = wifi_signal.decode("utf-8").strip().split(' ')[1].split('=')[1].split('/')[0]
-            wifi_signal = round((int(wifi_signal) / 70)* 100)
 
+def _count_spawns(event, args):
+    global _spawn_count
+    if event in _SPAWN_EVENTS:
+        with _spawn_lock:
+            _spawn_count += 1
+
+
+sys.addaudithook(_count_spawns)
+
+
+def spawn_count(reset=False):
+    """Return the number of processes launched since the last reset."""
+    global _spawn_count
+    with _spawn_lock:
+        count = _spawn_count
+        if reset:
+            _spawn_count = 0
+    return count
+
+
+# Messages and payload bytes sent to the broker or the Home Assistant API,
+# for the self_monitoring sensors
+_sent_lock = threading.Lock()
+_sent = {"messages": 0, "bytes": 0}
+
+
+def count_sent(size):
+    with _sent_lock:
+        _sent["messages"] += 1
+        _sent["bytes"] += size
+
+
+def sent_count(reset=False):
+    """Return (messages, bytes) sent since the last reset."""
+    with _sent_lock:
+        counts = (_sent["messages"], _sent["bytes"])
+        if reset:
+            _sent["messages"] = _sent["bytes"] = 0
+    return counts
+
+
+# Outcome of the MQTT publishes waited for by wait_for_delivery()
+_delivery = {"delivered": 0, "timed_out": 0, "failed": 0}
+
+
+def count_delivery(delivered, timed_out, failed):
+    with _sent_lock:
+        _delivery["delivered"] += delivered
+        _delivery["timed_out"] += timed_out
+        _delivery["failed"] += failed
+
+
+def delivery_count(reset=False):
+    """Return {"delivered", "timed_out", "failed"} since the last reset."""
+    with _sent_lock:
+        counts = dict(_delivery)
+        if reset:
+            _delivery.update(delivered=0, timed_out=0, failed=0)
+    return counts
+
+
+def _read_text(path):
+    """Return the stripped contents of a /proc, /sys or /etc text file, or None."""
+    try:
+        with open(path) as f:
+            return f.read().strip()
     except Exception:
-        wifi_signal = None if config.use_availability else 0
+        return None
+
 
-    return wifi_signal
+def read_meminfo():
+    """Parse /proc/meminfo into {field: kB}."""
+    meminfo = {}
+    for line in (_read_text('/proc/meminfo') or '').splitlines():
+        key, _, rest = line.partition(':')
+        try:
+            meminfo[key] = int(rest.split()[0])
+        except (IndexError, ValueError):
+            continue
+    return meminfo
+
+
+def read_cpuinfo_field(substring):
+    """Value of the first /proc/cpuinfo line whose key contains substring
+    (e.g. 'name' -> 'model name'), or None."""
+    for line in (_read_text('/proc/cpuinfo') or '').splitlines():
+        key, sep, value = line.partition(':')
+        if sep and substring in key:
+            return value.strip()
+    return None
+
+
+def read_os_release():
+    """Parse /etc/os-release into {KEY: value} with quotes removed."""
+    fields = {}
+    for line in (_read_text('/etc/os-release') or '').splitlines():
+        key, sep, value = line.partition('=')
+        if sep:
+            fields[key.strip().upper()] = value.strip().strip('"\'')
+    return fields
+
+
+def _wifi_interface():
+    """Name of the first wireless interface (the one cfg80211 registered)."""
+    for path in sorted(glob.glob('/sys/class/ieee80211/*/device/net/*')):
+        return os.path.basename(path)
+    return None
+
+
+def check_wifi_signal(format):
+    # /proc/net/wireless: "wlan0: 0000   54.  -56.  -256 ..." = status, link
+    # quality (out of 70), signal level (dBm), noise -- the same figures iwconfig shows.
+    try:
+        interface = _wifi_interface()
+        for line in (_read_text('/proc/net/wireless') or '').splitlines():
+            name, sep, fields = line.partition(':')
+            if sep and name.strip() == interface:
+                fields = fields.split()
+                if format == 'dbm':
+                    return int(float(fields[2]))
+                return round((float(fields[1]) / 70) * 100)
+        raise ValueError("no wireless statistics for {}".format(interface))
+    except Exception:
+        return None if config.use_availability else 0
 
 
 def _slugify(text):
@@ -82,8 +209,122 @@ def check_used_space(path):
         return None if config.use_availability else 0
 
 
-def check_cpu_load():
-    return psutil.cpu_percent(interval=1)
+# Column order of the cpu lines in /proc/stat (guest time is already included
+# in user/nice, so the guest columns are not read).
+CPU_STATES = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+
+def read_cpu_times():
+    """Return {'cpu': [jiffies...], 'cpu0': [...], ...} from /proc/stat, in CPU_STATES order."""
+    times = {}
+    for line in (_read_text('/proc/stat') or '').splitlines():
+        if not line.startswith('cpu'):
+            break
+        fields = line.split()
+        times[fields[0]] = [int(v) for v in fields[1:len(CPU_STATES) + 1]]
+    return times
+
+
+def cpu_usage(before, after):
+    """Utilisation between two read_cpu_times() snapshots as
+    {'cpu': {'load': %, 'user': %, 'system': %, 'iowait': %, 'steal': %}, 'cpu0': {...}, ...}.
+    user includes nice and system includes irq/softirq time."""
+    usage = {}
+    for name, now in after.items():
+        if name not in before:
+            continue
+        delta = dict(zip(CPU_STATES, (max(0, a - b) for a, b in zip(now, before[name]))))
+        total = sum(delta.values())
+        if total <= 0:
+            continue
+        pct = lambda jiffies: round(jiffies / total * 100, 1)
+        usage[name] = {
+            'load': pct(total - delta['idle'] - delta['iowait']),
+            'user': pct(delta['user'] + delta['nice']),
+            'system': pct(delta['system'] + delta['irq'] + delta['softirq']),
+            'iowait': pct(delta['iowait']),
+            'steal': pct(delta['steal']),
+        }
+    return usage
+
+
+class CpuSampler:
+    """CPU utilisation from /proc/stat deltas, without sleeping in the cycle.
+
+    since_last() covers the time since its previous call (the whole service
+    sleep interval); window() covers the last `seconds`, from snapshots a
+    background thread takes every second. Both fall back to a blocking
+    one-second sample when there is no earlier snapshot (first reading, cron)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = None
+        self._snapshots = None
+        self._thread = None
+
+    def blocking(self, interval=1):
+        before = read_cpu_times()
+        time.sleep(interval)
+        return cpu_usage(before, read_cpu_times())
+
+    def since_last(self):
+        with self._lock:
+            before, self._last = self._last, read_cpu_times()
+        usage = cpu_usage(before, self._last) if before is not None else {}
+        # No snapshot yet, or called again before a clock tick went by
+        return usage if 'cpu' in usage else self.blocking()
+
+    def window(self, seconds):
+        with self._lock:
+            if self._thread is None:
+                self._snapshots = collections.deque(maxlen=max(2, int(seconds) + 1))
+                self._thread = threading.Thread(target=self._sample_loop, name="cpu-sampler", daemon=True)
+                self._thread.start()
+            snapshots = list(self._snapshots)
+        if len(snapshots) < 2:
+            return self.blocking()
+        return cpu_usage(snapshots[0], snapshots[-1])
+
+    def _sample_loop(self):
+        while not stop_event.is_set():
+            snapshot = read_cpu_times()
+            with self._lock:
+                self._snapshots.append(snapshot)
+            stop_event.wait(1)
+
+
+cpu_sampler = CpuSampler()
+
+
+def read_cpu_usage():
+    """cpu_usage() measured the way cpu_load_mode asks for."""
+    mode = getattr(config, "cpu_load_mode", "cycle")
+    if mode == "window":
+        return cpu_sampler.window(getattr(config, "cpu_load_window", 10))
+    if mode == "cycle":
+        return cpu_sampler.since_last()
+    return cpu_sampler.blocking()
+
+
+def check_cpu_stats():
+    """cpu_load plus the optional per-state (cpu_user, ...) and per-core
+    (cpu_load_per_core) sensors, all from one sampler reading."""
+    na = None if config.use_availability else 0
+    try:
+        usage = read_cpu_usage()
+        total = usage['cpu']
+    except Exception as e:
+        print("Error reading /proc/stat: {}".format(e))
+        usage, total = {}, {}
+    values = {}
+    if config.cpu_load:
+        values["cpu_load"] = total.get('load', na)
+    for state in ('user', 'system', 'iowait', 'steal'):
+        if getattr(config, "cpu_" + state, False):
+            values["cpu_" + state] = total.get(state, na)
+    if getattr(config, "cpu_load_per_core", False):
+        values["cpu_load_per_core"] = {name[3:]: core['load'] for name, core in usage.items() if name != 'cpu'}
+    return values
 
 
 def check_voltage():
@@ -109,31 +350,61 @@ def check_voltage():
 
 def check_swap():
     try:
-        full_cmd = "free | grep -i swap | awk 'NR == 1 {if($2 > 0) {print $3/$2*100} else {print 0}}'"
-        swap = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0]
-        return round(float(swap.decode("utf-8").replace(",", ".")), 1)
+        meminfo = read_meminfo()
+        total = meminfo['SwapTotal']
+        if total <= 0:
+            return 0
+        return round((total - meminfo['SwapFree']) / total * 100, 1)
     except Exception:
         return None if config.use_availability else 0
 
 
 def check_memory():
-    full_cmd = 'free -b | awk \'NR==2 {printf "%.2f\\n", $3/$2 * 100}\''
-    memory = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0]
+    # Same "used" as free(1) from procps-ng 4: total minus what the kernel
+    # estimates is available; older kernels without MemAvailable fall back to
+    # total - free - buffers - page cache.
+    try:
+        meminfo = read_meminfo()
+        total = meminfo['MemTotal']
+        if 'MemAvailable' in meminfo:
+            used = total - meminfo['MemAvailable']
+        else:
+            used = (total - meminfo['MemFree'] - meminfo.get('Buffers', 0)
+                    - meminfo.get('Cached', 0) - meminfo.get('SReclaimable', 0))
+        return round(used / total * 100)
+    except Exception:
+        return 0
 
-    if memory:
-        memory = round(float(memory.decode("utf-8").replace(",", ".")))
-    else:
-        memory = 0
 
-    return memory
+_throttled_path = None
+
+
+def throttled_sysfs_path():
+    """The Raspberry Pi firmware driver's get_throttled attribute (kernels 4.19+),
+    or '' when there is none. Resolved once."""
+    global _throttled_path
+    if _throttled_path is None:
+        paths = (glob.glob('/sys/devices/platform/soc/soc:firmware/get_throttled')
+                 or glob.glob('/sys/devices/platform/*/*:firmware/get_throttled'))
+        _throttled_path = paths[0] if paths else ''
+    return _throttled_path
+
+
+def read_throttled():
+    """Raspberry Pi throttling flags as an int. Read from the firmware driver's
+    sysfs attribute (hex), falling back to vcgencmd."""
+    if throttled_sysfs_path():
+        text = _read_text(_throttled_path)
+        if text:
+            return int(text, 16)
+    full_cmd = "vcgencmd get_throttled | cut -d= -f2"
+    throttled = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0]
+    return int(throttled.decode('utf-8').strip(), 16)
 
 
 def check_rpi_power_status():
     try:
-        full_cmd = "vcgencmd get_throttled | cut -d= -f2"
-        throttled = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0]
-        throttled = throttled.decode('utf-8').strip()
-        throttled_val = int(throttled, 16)
+        throttled_val = read_throttled()
 
         if throttled_val & 1<<0:
             return "Under-voltage"
@@ -162,6 +433,96 @@ def check_rpi_power_status():
         return "Error: " + str(e)
 
 
+def _cpu_thermal_zone_path():
+    """sysfs temperature file of the CPU thermal zone (config.cpu_thermal_zone,
+    or a usual CPU zone name), falling back to thermal_zone0."""
+    names = (config.cpu_thermal_zone, 'cpu-thermal', 'cpu_thermal', 'x86_pkg_temp', 'soc_thermal')
+    zones = sorted(glob.glob('/sys/class/thermal/thermal_zone*'))
+    for zone in zones:
+        zone_type = _read_text(os.path.join(zone, 'type'))
+        if zone_type and (zone_type in names or zone_type.replace('-', '_') in names):
+            return os.path.join(zone, 'temp')
+    return os.path.join(zones[0], 'temp') if zones else None
+
+
+class FastSampler:
+    """Reads the cheap kernel sources (CPU load, CPU temperature, clock speed,
+    memory and the Pi throttling flags) every fast_sample_interval seconds in
+    --service mode, without forking, and summarises the readings taken since
+    the previous publish as min/max/mean/p95."""
+
+    METRICS = ('cpu_load', 'cpu_temp', 'sys_clock_speed', 'memory')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {key: [] for key in self.METRICS}
+        self._throttled = []
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fast-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = max(0.2, float(getattr(config, "fast_sample_interval", 1)))
+        temp_path = _cpu_thermal_zone_path()
+        throttled_path = throttled_sysfs_path()  # no vcgencmd fallback here
+        previous = read_cpu_times()
+        while not stop_event.wait(interval):
+            current = read_cpu_times()
+            sample = {
+                'cpu_load': cpu_usage(previous, current).get('cpu', {}).get('load'),
+                'cpu_temp': _read_sysfs_num(temp_path, 1e-3, 2) if temp_path else None,
+                'sys_clock_speed': _read_sysfs_num('/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq', 1e-3, 0),
+                'memory': check_memory(),
+            }
+            previous = current
+            throttled = _read_text(throttled_path) if throttled_path else None
+            with self._lock:
+                for key, value in sample.items():
+                    if value is not None:
+                        self._samples[key].append(value)
+                if throttled:
+                    self._throttled.append(int(throttled, 16))
+
+    def take_window(self):
+        """Return {metric: {min, max, mean, p95, samples}} for the readings since
+        the previous call and start a new window. rpi_power_status gets the
+        throttling flags seen during the window instead."""
+        with self._lock:
+            samples, self._samples = self._samples, {key: [] for key in self.METRICS}
+            throttled, self._throttled = self._throttled, []
+        stats = {}
+        for key, values in samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            stats[key] = {
+                'min': ordered[0],
+                'max': ordered[-1],
+                'mean': round(sum(ordered) / len(ordered), 2),
+                'p95': ordered[max(0, math.ceil(len(ordered) * 0.95) - 1)],
+                'samples': len(ordered),
+            }
+        if throttled:
+            seen = 0
+            for flags in throttled:
+                seen |= flags
+            stats['rpi_power_status'] = {
+                'flags': hex(seen),
+                'under_voltage_samples': sum(1 for flags in throttled if flags & 1 << 0),
+                'throttled_samples': sum(1 for flags in throttled if flags & 1 << 2),
+                'samples': len(throttled),
+            }
+        return stats
+
+
+fast_sampler = FastSampler()
+
+
 def check_service_file_exists():
     service_file_path = "/etc/systemd/system/rpi-mqtt-monitor.service"
     return os.path.exists(service_file_path)
@@ -259,9 +620,8 @@ def check_cpu_temp():
 
 def check_sys_clock_speed():
     try:
-        full_cmd = "awk '{printf (\"%0.0f\",$1/1000); }' </sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq"
-        byte_data = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0]
-        return int(byte_data.decode("utf-8").strip())
+        khz = _read_text('/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq')
+        return int(round(int(khz) / 1000))
     except Exception:
         return None if config.use_availability else 0
 
@@ -269,58 +629,45 @@ def check_sys_clock_speed():
 def check_uptime(format):
     try:
         if format == 'timestamp':
-            full_cmd = "uptime -s"
-            tz_cmd = "date +%z"
-            tz_str = subprocess.Popen(tz_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0].decode('utf-8').strip()
-            timestamp_str = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0].decode('utf-8').strip()
-            timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-            iso_timestamp = timestamp.isoformat() + tz_str  # Append correct offset to indicate `local` time
-            return iso_timestamp
-        else:
-            full_cmd = "awk '{print int($1"+format+")}' /proc/uptime"
-        return int(subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE).communicate()[0])
+            # btime in /proc/stat is the boot time in epoch seconds; render it as
+            # local time with the correct offset, like `uptime -s` + `date +%z`.
+            for line in (_read_text('/proc/stat') or '').splitlines():
+                if line.startswith('btime '):
+                    timestamp = datetime.fromtimestamp(int(line.split()[1]))
+                    return timestamp.isoformat() + time.strftime('%z', time.localtime())
+            raise ValueError("btime missing from /proc/stat")
+        return int(float(_read_text('/proc/uptime').split()[0]))
     except Exception:
         return None if config.use_availability else 0
 
 
 def check_model_name():
-   full_cmd = "cat /sys/firmware/devicetree/base/model"
-   model_name = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-   if model_name == '':
-        full_cmd = "cat /proc/cpuinfo  | grep 'name'| uniq"
-        model_name = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-        try:
-            model_name = model_name.split(':')[1]
-        except Exception:
+    model_name = _read_text('/sys/firmware/devicetree/base/model')
+    if not model_name:
+        model_name = read_cpuinfo_field('name')
+        if model_name is None:
             model_name = None if config.use_availability else 'Unknown'
 
-   # devicetree appends a trailing NUL and cpuinfo a leading space/newline; strip both so
-   # display width and MQTT payloads stay clean.
-   if isinstance(model_name, str):
+    # devicetree appends a trailing NUL and cpuinfo a leading space/newline; strip both so
+    # display width and MQTT payloads stay clean.
+    if isinstance(model_name, str):
         model_name = model_name.replace('\x00', '').strip()
 
-   return model_name
+    return model_name
 
 
 def check_rpi5_fan_speed():
-    try:
-        full_cmd = "cat /sys/devices/platform/cooling_fan/hwmon/*/fan1_input"
-        rpi5_fan_speed = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8").strip()
-        if not rpi5_fan_speed:
-            return None if config.use_availability else 0
+    rpi5_fan_speed = sysfs_index.read(sysfs_index.get()['rpi5_fan'])
+    if rpi5_fan_speed:
         return rpi5_fan_speed
-    except Exception:
-        return None if config.use_availability else 0
+    return None if config.use_availability else 0
 
 
 def get_os():
-    full_cmd = 'cat /etc/os-release | grep -i pretty_name'
-    pretty_name = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-    try:
-        pretty_name = pretty_name.split('=')[1].replace('"', '').replace('\n', '')
-    except Exception:
+    pretty_name = read_os_release().get('PRETTY_NAME')
+    if pretty_name is None:
         pretty_name = None if config.use_availability else 'Unknown'
-        
+
     return(pretty_name)
 
 
@@ -328,9 +675,9 @@ def get_manufacturer():
     try:
         model = check_model_name()
         if model and 'Raspberry' not in model:
-            full_cmd = "cat /proc/cpuinfo  | grep 'vendor'| uniq"
-            pretty_name = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-            pretty_name = pretty_name.split(':')[1].strip()
+            pretty_name = read_cpuinfo_field('vendor')
+            if pretty_name is None:
+                raise ValueError("no vendor in /proc/cpuinfo")
         else:
             pretty_name = 'Raspberry Pi'
     except Exception:
@@ -339,8 +686,38 @@ def get_manufacturer():
     return(pretty_name)
 
 
+def remote_release(refresh=False, offline=False):
+    """{"version", "release_notes", "checked_at"} of the latest release, kept in
+    update.remote_release_path(). The network is only asked on refresh (the
+    periodic update check) or when nothing is cached yet, and never when offline
+    is set (-d), which returns None instead."""
+    path = update.remote_release_path(script_dir)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except Exception:
+        cached = None
+    if offline or (cached is not None and not refresh):
+        return cached
+    version = update.check_git_version_remote(script_dir)
+    if cached is not None and cached.get("version") == version:
+        release_notes = cached.get("release_notes", "")
+    else:
+        release_notes = get_release_notes(version)
+    release = {"version": version, "release_notes": release_notes, "checked_at": time.time()}
+    try:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(release, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        # not fatal: e.g. a cron user cannot write the file the root service created
+        pass
+    return release
+
+
 def check_git_update(script_dir):
-    remote_version = update.check_git_version_remote(script_dir)
+    remote_version = remote_release(refresh=True)["version"]
     if config.version == remote_version:
         git_update = {
                     "installed_ver": config.version,
@@ -402,6 +779,59 @@ def get_mac_address():
     return mac
 
 
+_device_facts = None
+
+
+def probe_device_facts():
+    return {
+        "model": check_model_name(),
+        "manufacturer": get_manufacturer(),
+        "os": get_os(),
+        "mac": get_mac_address(),
+        "git_version": check_git_version(script_dir),
+        "probed_at": time.time(),
+    }
+
+
+def device_facts():
+    """Model, manufacturer, OS, MAC address and git version, which hardly ever
+    change. Probed once and kept in memory and in update.device_facts_path(),
+    so later cron runs reuse them too, until device_facts_ttl seconds have
+    passed, the service gets a SIGHUP or update.do_update() has run."""
+    global _device_facts
+    ttl = getattr(config, "device_facts_ttl", 86400)
+    facts = _device_facts
+    if facts is not None and time.time() - facts.get("probed_at", 0) < ttl:
+        return facts
+    path = update.device_facts_path(script_dir)
+    try:
+        with open(path) as f:
+            facts = json.load(f)
+    except Exception:
+        facts = None
+    if facts is None or time.time() - facts.get("probed_at", 0) >= ttl:
+        facts = probe_device_facts()
+        try:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(facts, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            # not fatal: e.g. a cron user cannot write the file the root service created
+            pass
+    _device_facts = facts
+    return facts
+
+
+def invalidate_device_facts(signum=None, frame=None):
+    """Drop the cached device facts (SIGHUP handler in --service mode) and let
+    the next cycle re-probe them and republish the discovery configs."""
+    global _device_facts
+    _device_facts = None
+    update.invalidate_device_facts(script_dir)
+    reset_discovery_cache()
+
+
 def get_apt_updates():
     try:
         subprocess.run(['sudo', 'apt', 'update'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -416,6 +846,133 @@ def get_apt_updates():
     return updates_count
 
 
+class SysfsIndex:
+    """Resolved hwmon / DRM sensor paths, so a cycle reads a few known files
+    instead of globbing /sys/class/hwmon and /sys/class/drm. Built on first
+    use and rebuilt after sysfs_rescan_interval seconds, when a read fails
+    (device gone) or, in --service mode, when the kernel reports a hwmon or
+    drm device being added or removed (uevent netlink socket).
+
+    read() keeps each file open and pread()s it from offset 0, which makes
+    sysfs generate a fresh value without an open()/close() per reading."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built = 0
+        self._fds = {}
+        self._watcher = None
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def get(self):
+        """{'drive_temps': {name: path}, 'vcore': path, 'rpi5_fan': path,
+        'amd_gpus': [{'slot', 'device', 'hwmon', 'temps': {label: path}}]}"""
+        with self._lock:
+            interval = getattr(config, "sysfs_rescan_interval", 300)
+            if self._index is None or time.monotonic() - self._built > interval:
+                self._close_fds()
+                self._index = self._scan()
+                self._built = time.monotonic()
+            return self._index
+
+    @staticmethod
+    def _scan():
+        index = {'drive_temps': {}, 'vcore': None, 'rpi5_fan': None, 'amd_gpus': []}
+        for hwmon in sorted(glob.glob('/sys/class/hwmon/hwmon*')):
+            device_name = get_hwmon_device_name(hwmon)
+            if device_name and any(keyword in device_name.lower() for keyword in ['nvme', 'sd']):
+                temps = sorted(glob.glob(os.path.join(hwmon, 'temp*_input')))
+                if temps:
+                    index['drive_temps'][device_name] = temps[0]
+            if index['vcore'] is None:
+                # Super-I/O sensors on non-Pi hardware: the input labelled as the CPU core rail
+                for inp in sorted(glob.glob(os.path.join(hwmon, 'in*_input'))):
+                    label = (_read_text(inp[:-len('_input')] + '_label') or '').lower()
+                    if 'vcore' in label or 'cpu' in label:
+                        index['vcore'] = inp
+                        break
+        fans = glob.glob('/sys/devices/platform/cooling_fan/hwmon/*/fan1_input')
+        index['rpi5_fan'] = fans[0] if fans else None
+        for card in sorted(glob.glob("/sys/class/drm/card[0-9]*/device")):
+            driver = os.path.join(card, "driver")
+            if os.path.islink(driver) and os.path.basename(os.readlink(driver)) == "amdgpu":
+                hwmons = sorted(glob.glob(os.path.join(card, "hwmon", "hwmon*")))
+                hwmon = hwmons[0] if hwmons else None
+                temps = {}
+                for inp in sorted(glob.glob(os.path.join(hwmon, 'temp*_input'))) if hwmon else []:
+                    # edge / junction / mem
+                    label = (_read_text(inp[:-len('_input')] + '_label') or '').lower()
+                    temps.setdefault(label or 'edge', inp)
+                index['amd_gpus'].append({
+                    'slot': os.path.basename(os.path.realpath(card)),  # PCI address, e.g. 0000:03:00.0
+                    'device': card,
+                    'hwmon': hwmon,
+                    'temps': temps,
+                })
+        return index
+
+    def _close_fds(self):
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds.clear()
+
+    def read(self, path):
+        """Stripped contents of a sysfs file, or None. The lock is held across
+        the pread(): a rescan closes every fd, and a closed fd number can be
+        reused by another file, which would then be read instead."""
+        if not path:
+            return None
+        with self._lock:
+            fd = self._fds.get(path)
+            if fd is None:
+                try:
+                    fd = self._fds[path] = os.open(path, os.O_RDONLY)
+                except OSError:
+                    return None
+            try:
+                return os.pread(fd, 4096, 0).decode('utf-8', 'replace').strip()
+            except OSError:
+                # the device went away: forget the file and look again
+                del self._fds[path]
+                os.close(fd)
+                self._index = None
+                return None
+
+    def start_watcher(self, loop):
+        """Rebuild the index when hwmon / drm devices come and go: the uevent
+        socket is watched by the service's event loop."""
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, 15)  # NETLINK_KOBJECT_UEVENT
+            sock.bind((0, 1))  # kernel uevents multicast group
+            sock.setblocking(False)
+        except (OSError, AttributeError) as e:
+            print("Hotplug events unavailable, relying on the periodic sysfs rescan:", e)
+            return
+        self._watcher = sock
+        loop.add_reader(sock, self._on_uevent, loop, sock)
+
+    def _on_uevent(self, loop, sock):
+        try:
+            event = sock.recv(8192)
+        except BlockingIOError:
+            return
+        except OSError:
+            loop.remove_reader(sock)
+            sock.close()
+            return
+        if event.startswith((b'add@', b'remove@')) and (b'SUBSYSTEM=hwmon' in event or b'SUBSYSTEM=drm' in event):
+            self.invalidate()
+
+
+sysfs_index = SysfsIndex()
+
+
 def get_hwmon_device_name(hwmon_path):
     try:
         with open(os.path.join(hwmon_path, 'name'), 'r') as f:
@@ -425,55 +982,124 @@ def get_hwmon_device_name(hwmon_path):
         return None
 
 
-def get_hwmon_temp(hwmon_path):
-    try:
-        temp_files = glob.glob(os.path.join(hwmon_path, 'temp*_input'))
-        for temp_file in temp_files:
-            with open(temp_file, 'r') as tf:
-                temp = int(tf.read().strip()) / 1000.0
-                return temp
-    except Exception as e:
-        print(f"Error reading temperature for {hwmon_path}: {e}")
-        return None
-
-
 def check_all_drive_temps():
     drive_temps = {}
-    hwmon_devices = glob.glob('/sys/class/hwmon/hwmon*')
-    for hwmon in hwmon_devices:
-        device_name = get_hwmon_device_name(hwmon)
-        if device_name and any(keyword in device_name.lower() for keyword in ['nvme', 'sd']):
-            temp = get_hwmon_temp(hwmon)
-            if temp is not None:
-                drive_temps[device_name] = temp
+    for device_name, path in sysfs_index.get()['drive_temps'].items():
+        temp = _read_sysfs_num(path, 1e-3, 3)
+        if temp is not None:
+            drive_temps[device_name] = temp
     return drive_temps
 
 
-def _list_ssd_devices():
-    """Return [(device_path, friendly_name), ...] for non-rotational disks
-    (NVMe and SATA SSDs). Rotational HDDs and virtual loop/ram devices are skipped."""
+# Names of the rotational drives reported by ssd_health (shown as HDD, not SSD)
+_rotational_drives = set()
+
+
+def _list_block_devices():
+    """Return [(name, rotational), ...] for the physical disks in /sys/block
+    (SD cards, eMMC, NVMe, SATA). Virtual devices (loop, ram, zram, dm, md: no
+    backing device) and SCSI devices other than disks (optical drives, tape,
+    enclosures) are skipped."""
     devices = []
     for block in sorted(glob.glob('/sys/block/*')):
         name = os.path.basename(block)
         if name.startswith('loop') or name.startswith('ram') or name.startswith('zram'):
             continue
-        try:
-            with open(os.path.join(block, 'queue/rotational'), 'r') as f:
-                if f.read().strip() != '0':
-                    continue
-        except Exception:
+        if not os.path.exists(os.path.join(block, 'device')):
+            continue
+        # SCSI peripheral type, 0 = direct-access disk; absent for NVMe, text for MMC
+        scsi_type = _read_text(os.path.join(block, 'device/type'))
+        if scsi_type is not None and scsi_type.isdigit() and scsi_type != '0':
+            continue
+        rotational = _read_text(os.path.join(block, 'queue/rotational'))
+        if rotational is None:
             continue
+        devices.append((name, rotational != '0'))
+    return devices
+
+
+def _list_ssd_devices(include_rotational=False):
+    """Return [(device_path, friendly_name), ...] for non-rotational disks
+    (NVMe and SATA SSDs), and rotational HDDs too when include_rotational is set."""
+    devices = []
+    for name, rotational in _list_block_devices():
+        if rotational and not include_rotational:
+            continue
+        if rotational:
+            _rotational_drives.add(name)
         devices.append(("/dev/" + name, name))
     return devices
 
 
+def read_diskstats():
+    """{device: (reads, sectors read, ms reading, writes, sectors written,
+    ms writing, ms doing I/O, weighted ms doing I/O)} from /proc/diskstats."""
+    stats = {}
+    for line in (_read_text('/proc/diskstats') or '').splitlines():
+        fields = line.split()
+        if len(fields) < 14:
+            continue
+        values = [int(v) for v in fields[3:14]]
+        # skip merges and the in-flight gauge (index 8): they are not rates
+        stats[fields[2]] = (values[0], values[2], values[3], values[4], values[6], values[7], values[9], values[10])
+    return stats
+
+
+# the I/O and sector counts are unsigned long, the millisecond times unsigned int
+disk_io_sampler = counters.CounterSampler(read_diskstats, (counters.LONG_BITS, counters.LONG_BITS, 32,
+                                                           counters.LONG_BITS, counters.LONG_BITS, 32, 32, 32))
+
+# disk I/O metric -> (icon, name, unit, device_class)
+DISK_IO_SENSORS = {
+    "read_rate": ("mdi:harddisk", "Read", "B/s", "data_rate"),
+    "write_rate": ("mdi:harddisk", "Write", "B/s", "data_rate"),
+    "iops": ("mdi:swap-vertical", "IOPS", "IOPS", None),
+    "await": ("mdi:timer-sand", "Await", "ms", "duration"),
+    "queue": ("mdi:tray-full", "Queue Depth", None, None),
+    "busy": ("mdi:gauge", "Busy", "%", None),
+}
+
+
+def check_disk_io():
+    """{device: {read_rate, write_rate, iops, await, queue, busy}} for the disks
+    of _list_block_devices() (or those matching disk_io_devices), from the
+    /proc/diskstats deltas since the previous call."""
+    patterns = getattr(config, "disk_io_devices", []) or []
+    devices = [name for name, _ in _list_block_devices()
+               if not patterns or any(fnmatch.fnmatch(name, p) for p in patterns)]
+    elapsed, deltas = disk_io_sampler.deltas()
+    disk_io = {}
+    for name in devices:
+        if name not in deltas or elapsed <= 0:
+            continue
+        reads, sectors_read, ms_read, writes, sectors_written, ms_write, ms_io, weighted_ms = deltas[name]
+        ios = reads + writes
+        disk_io[name] = {
+            "read_rate": round(sectors_read * 512 / elapsed),
+            "write_rate": round(sectors_written * 512 / elapsed),
+            "iops": round(ios / elapsed, 1),
+            "await": round((ms_read + ms_write) / ios, 2) if ios else 0,
+            "queue": round(weighted_ms / (elapsed * 1000), 2),
+            "busy": round(min(100, ms_io / (elapsed * 10)), 1),
+        }
+    return disk_io
+
+
+def disk_io_entities(disk_io):
+    """(key, device, value) of the disk I/O sensors: <device>_io_<metric>."""
+    for device, metrics in (disk_io or {}).items():
+        for metric, value in metrics.items():
+            yield "{}_io_{}".format(device, metric), device, value
+
+
 def get_smartctl_data(device_path):
     """Run smartctl and return the parsed JSON dict, or None on failure.
     smartctl sets low exit-code bits when SMART flags trip but still emits valid
     JSON, so the return code is ignored and only stdout is parsed."""
     try:
+        # -n standby: do not spin up a sleeping drive just to read its attributes
         out = subprocess.run(
-            ["sudo", "-n", "smartctl", "-j", "-H", "-A", "-i", device_path],
+            ["sudo", "-n", "smartctl", "-j", "-n", "standby", "-H", "-A", "-i", device_path],
             capture_output=True, text=True, timeout=15).stdout.strip()
         # Empty stdout means smartctl couldn't run (missing binary, no passwordless
         # sudo, etc.). Treat as "no data" and skip the drive silently so the message
@@ -522,18 +1148,68 @@ def _extract_ssd_metrics(data):
     return metrics
 
 
+def _drive_kind(name):
+    return "HDD" if name in _rotational_drives else "SSD"
+
+
+# device_path -> [time.time() read, metrics] of the last successful smartctl
+# run; loaded from and saved to update.smart_cache_path() so cron runs share it
+_smart_cache = None
+
+
+def _load_smart_cache():
+    global _smart_cache
+    if _smart_cache is None:
+        try:
+            with open(update.smart_cache_path(script_dir)) as f:
+                _smart_cache = json.load(f)
+        except Exception:
+            _smart_cache = {}
+    return _smart_cache
+
+
+def _save_smart_cache():
+    path = update.smart_cache_path(script_dir)
+    try:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_smart_cache, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        # not fatal: the next run just reads the drives again
+        pass
+
+
+def _smart_metrics(device_path):
+    """SMART metrics of one drive: reused for smart_cache_ttl seconds, and the
+    last known values while the drive is in standby. None when unknown."""
+    cached = _smart_cache.get(device_path)
+    if cached is not None and time.time() - cached[0] < getattr(config, "smart_cache_ttl", 18000):
+        return cached[1]
+    data = get_smartctl_data(device_path)
+    # smartctl exits with status 2 without reading anything when -n standby
+    # finds the drive asleep
+    if not data or (data.get("smartctl", {}).get("exit_status") == 2 and "smart_status" not in data):
+        return cached[1] if cached is not None else None
+    metrics = _extract_ssd_metrics(data)
+    if metrics:
+        _smart_cache[device_path] = [time.time(), metrics]
+    return metrics
+
+
 def check_all_ssd_health():
-    """Return {friendly_name: {metric: value, ...}, ...} for every SSD, gathered
-    from smartctl. Drives that return no usable data are skipped."""
-    ssd_health = {}
-    for device_path, name in _list_ssd_devices():
-        data = get_smartctl_data(device_path)
-        if not data:
-            continue
-        metrics = _extract_ssd_metrics(data)
-        if metrics:
-            ssd_health[name] = metrics
-    return ssd_health
+    """Return {friendly_name: {metric: value, ...}, ...} for every SSD (and HDD
+    with smart_include_hdd), gathered from smartctl on up to smart_workers
+    drives at a time. Drives that return no usable data are skipped."""
+    devices = _list_ssd_devices(getattr(config, "smart_include_hdd", False))
+    if not devices:
+        return {}
+    workers = max(1, int(getattr(config, "smart_workers", 4)))
+    before = json.dumps(_load_smart_cache(), sort_keys=True)
+    results = daemon_map(lambda device: _smart_metrics(device[0]), devices, workers)
+    if json.dumps(_smart_cache, sort_keys=True) != before:
+        _save_smart_cache()
+    return {name: metrics for (_, name), metrics in zip(devices, results) if metrics}
 
 
 def print_measured_values(monitored_values):
@@ -600,7 +1276,6 @@ def print_measured_values(monitored_values):
         except (TypeError, ValueError):
             return f"{value}°C"
 
-    remote_version = update.check_git_version_remote(script_dir)
     lines = [f"\n{BCYAN}╔{LD}╗{R}"]
 
     title_v = f"rpi-mqtt-monitor  v{config.version}"
@@ -609,13 +1284,18 @@ def print_measured_values(monitored_values):
 
     # Device section
     lines.append(_section("DEVICE"))
-    lines.append(_row("Model",       f"{WHITE}{check_model_name()}{R}"))
-    lines.append(_row("Manufacturer",f"{WHITE}{get_manufacturer()}{R}"))
-    lines.append(_row("OS",          f"{WHITE}{get_os()}{R}"))
+    facts = device_facts()
+    lines.append(_row("Model",       f"{WHITE}{facts['model']}{R}"))
+    lines.append(_row("Manufacturer",f"{WHITE}{facts['manufacturer']}{R}"))
+    lines.append(_row("OS",          f"{WHITE}{facts['os']}{R}"))
+    if facts['git_version']:
+        lines.append(_row("Git Tag",     f"{WHITE}{facts['git_version']}{R}"))
     lines.append(_row("Hostname",    f"{CYAN}{hostname}{R}"))
     lines.append(_row("IP Address",  f"{CYAN}{get_network_ip()}{R}"))
-    lines.append(_row("MAC Address", f"{GRAY}{get_mac_address()}{R}"))
+    lines.append(_row("MAC Address", f"{GRAY}{facts['mac']}{R}"))
     lines.append(_row("Sleep",       f"{WHITE}{config.service_sleep_time}s{R}"))
+    if cycle_spawns is not None:
+        lines.append(_row("Spawned",     f"{WHITE}{cycle_spawns} process(es) per cycle{R}"))
     if config.update:
         lines.append(_row("Update Check", f"{WHITE}{config.update_check_interval}s{R}"))
 
@@ -635,10 +1315,17 @@ def print_measured_values(monitored_values):
             w, c = (warn or 70), (crit or 90)
             lines.append(_row(label, f"{_bar(v, warn=w, crit=c)}  {_cpct(v, unit, w, c)}"))
 
+    for core, load in (monitored_values.get("cpu_load_per_core") or {}).items():
+        lines.append(_row(f"  Core {core}", f"{_bar(load)}  {_cpct(load)}"))
+
     if "cpu_temp" in monitored_values:
         lines.append(_row("CPU Temp", _ctemp(monitored_values["cpu_temp"])))
 
     plain_metrics = [
+        ("cpu_user",        "CPU User",    "%"),
+        ("cpu_system",      "CPU System",  "%"),
+        ("cpu_iowait",      "CPU IO Wait", "%"),
+        ("cpu_steal",       "CPU Steal",   "%"),
         ("sys_clock_speed", "Clock Speed", "MHz"),
         ("voltage",         "Voltage",     "V"),
         ("wifi_signal_dbm", "WiFi",        "dBm"),
@@ -654,16 +1341,32 @@ def print_measured_values(monitored_values):
         ("nvidia_gpu_freq",  "GPU Freq",   "MHz"),
         ("nvidia_gpu_power", "GPU Power",  "W"),
         ("nvidia_gpu_temp",  "GPU Temp",   "°C"),
+        ("nvidia_gpu_enc",   "GPU Encoder", "%"),
+        ("nvidia_gpu_dec",   "GPU Decoder", "%"),
+        ("nvidia_gpu_pcie_tx", "GPU PCIe TX", "MB/s"),
+        ("nvidia_gpu_pcie_rx", "GPU PCIe RX", "MB/s"),
         ("amd_gpu_util",     "GPU Util",   "%"),
         ("amd_gpu_mem",      "GPU Mem",    "%"),
         ("amd_gpu_freq",     "GPU Freq",   "MHz"),
         ("amd_gpu_power",    "GPU Power",  "W"),
         ("amd_gpu_temp",     "GPU Temp",   "°C"),
+        ("amd_gpu_temp_junction", "GPU Junction", "°C"),
+        ("amd_gpu_temp_mem", "GPU Mem Temp", "°C"),
+        ("amd_gpu_vram_used", "GPU VRAM",  "B"),
+        ("amd_gpu_fan",      "GPU Fan",    "RPM"),
+        ("amd_gpu_power_cap", "GPU Power Cap", "W"),
     ]
     for key, label, unit in plain_metrics:
         if key in monitored_values:
             lines.append(_row(label, f"{WHITE}{monitored_values[key]} {unit}{R}"))
 
+    for key, device, value in nvidia_gpu_entities(monitored_values.get("nvidia_gpus")):
+        name, unit = NVIDIA_GPU_SENSORS[key.split("_", 2)[2]][1:3]
+        lines.append(_row(f"GPU {device} {name}", f"{WHITE}{value} {unit}{R}"))
+    for key, device, value in amd_gpu_entities(monitored_values.get("amd_gpus")):
+        name, unit = AMD_GPU_SENSORS[amd_gpu_metric(key, device)][1:3]
+        lines.append(_row(f"GPU {_pci_slot(device)} {name}", f"{WHITE}{value} {unit}{R}"))
+
     if "uptime" in monitored_values:
         lines.append(_row("Uptime", f"{WHITE}{monitored_values['uptime']}{R}"))
 
@@ -684,11 +1387,39 @@ def print_measured_values(monitored_values):
         for device, temp in (monitored_values["drive_temps"] or {}).items():
             lines.append(_row(f"{device.capitalize()} Temp", _ctemp(f"{temp:.1f}")))
 
+    for nic, rates in (monitored_values.get("net_rates") or {}).items():
+        lines.append(_row(f"{nic} Net", f"{WHITE}RX {rates['rx_rate']} B/s  TX {rates['tx_rate']} B/s{R}"))
+
+    for device, io in (monitored_values.get("disk_io") or {}).items():
+        lines.append(_row(f"{device} I/O", f"{WHITE}R {io['read_rate']} B/s  W {io['write_rate']} B/s  "
+                                           f"{io['iops']} IOPS  {io['await']} ms{R}"))
+
     if "ext_sensors" in monitored_values:
         for item in (monitored_values["ext_sensors"] or []):
             if item[3] is not None:
                 lines.append(_row(item[0], f"{WHITE}{item[3]}°C{R}"))
 
+    # History section: what the service recorded (see record_history())
+    history = get_history(writable=False)
+    if history is not None:
+        rows = []
+        # count buckets make up the sparkline, so it must fit the 60-column box
+        for tier, count, window in (("1h", 24, "last 24 h"), ("1m", 20, "last 20 min")):
+            rows = []
+            for entity in iter_entities(monitored_values):
+                buckets = history.buckets(entity.key, tier, count)
+                stats = buckets and history_module.summary(buckets)
+                if stats:
+                    rows.append((entity.key, buckets, stats))
+            # a young history has no hourly buckets to speak of yet
+            if any(sum(b is not None for b in buckets) > 1 for _, buckets, _ in rows):
+                break
+        if rows:
+            lines.append(_section(f"HISTORY  {GRAY}{window}  min / avg / max{R}"))
+            for key, buckets, stats in rows:
+                spark = history_module.sparkline(buckets[-count:])
+                lines.append(_row(key[:15], f"{CYAN}{spark}{R} {WHITE}{'/'.join(_short_number(v) for v in stats)}{R}"))
+
     # Scheduling section
     lines.append(_section("SCHEDULING"))
     scheduled = False
@@ -701,9 +1432,11 @@ def print_measured_values(monitored_values):
     if not scheduled:
         lines.append(f"{BCYAN}║{R}{_rpad(f'  {YELLOW}○{R}  not scheduled')}{BCYAN}║{R}")
 
-    # Release notes
+    # Release notes, as cached by the last update check: -d makes no network calls
     import textwrap as _tw
-    rn = get_release_notes(remote_version).strip()
+    release = remote_release(offline=True) or {}
+    remote_version = release.get("version", config.version)
+    rn = release.get("release_notes", "").strip()
     if rn:
         lines.append(_section(f"RELEASE NOTES  {GRAY}v{remote_version}{R}"))
         for rline in rn.splitlines():
@@ -714,6 +1447,14 @@ def print_measured_values(monitored_values):
     print('\n'.join(lines))
     
 
+def _short_number(value):
+    """Compact number for the -d history rows: 3 significant digits, k/M/G suffix."""
+    for limit, suffix in ((1e9, "G"), (1e6, "M"), (1e3, "k")):
+        if abs(value) >= limit:
+            return "%.3g%s" % (value / limit, suffix)
+    return "%.3g" % value
+
+
 def extract_text(html_string):
     html_string = html.unescape(html_string)
     text = re.sub('<[^<]+?>', '', html_string)
@@ -742,15 +1483,16 @@ def get_release_notes(version):
 
 
 def build_device_info():
+    facts = device_facts()
     return {
         "identifiers": [hostname],
         "manufacturer": 'github.com/hjelev',
         "model": f'RPi MQTT Monitor {config.version}',
         "name": hostname,
-        "sw_version": get_os(),
-        "hw_version": f"{check_model_name()} by {get_manufacturer()} IP:{get_network_ip()}",
+        "sw_version": facts["os"],
+        "hw_version": f"{facts['model']} by {facts['manufacturer']} IP:{get_network_ip()}",
         "configuration_url": "https://github.com/hjelev/rpi-mqtt-monitor",
-        "connections": [["mac", get_mac_address()]]
+        "connections": [["mac", facts["mac"]]]
     }
 
 def build_data_template(what_config):
@@ -775,6 +1517,11 @@ def add_common_attributes(data, icon, name, unit=None, device_class=None, state_
 def handle_specific_configurations(data, what_config, device):
     if what_config == "cpu_load":
         add_common_attributes(data, "mdi:speedometer", get_translation("cpu_load"), "%", None, "measurement")
+    elif what_config.startswith("cpu_load_core"):
+        add_common_attributes(data, "mdi:speedometer", "CPU Core " + device + " Load", "%", None, "measurement")
+    elif what_config in ("cpu_user", "cpu_system", "cpu_iowait", "cpu_steal"):
+        names = {"cpu_user": "CPU User", "cpu_system": "CPU System", "cpu_iowait": "CPU IO Wait", "cpu_steal": "CPU Steal"}
+        add_common_attributes(data, "mdi:chart-donut", names[what_config], "%", None, "measurement")
     elif what_config == "cpu_temp":
         add_common_attributes(data, "hass:thermometer", get_translation("cpu_temperature"), "°C", "temperature", "measurement")
     elif what_config == "used_space":
@@ -820,7 +1567,8 @@ def handle_specific_configurations(data, what_config, device):
         data["title"] = "Device Update"
         data["value_template"] = "{{ 'ON' if value_json.installed_ver != value_json.new_ver else 'OFF' }}"
     elif what_config == "update":
-        version = update.check_git_version_remote(script_dir)
+        release = remote_release()
+        version = release["version"]
         add_common_attributes(data, "mdi:update", get_translation("rpi_mqtt_monitor"), None, "firmware")
         data["title"] = "New Version"
         data["state_topic"] = config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "git_update"
@@ -834,7 +1582,7 @@ def handle_specific_configurations(data, what_config, device):
         data["payload_install"] = "install"
         data['release_url'] = "https://github.com/hjelev/rpi-mqtt-monitor/releases/tag/" + version
         data['entity_picture'] = "https://raw.githubusercontent.com/hjelev/rpi-mqtt-monitor/refs/heads/master/images/logo_small.png"
-        data['release_summary'] = get_release_notes(version)
+        data['release_summary'] = release["release_notes"]
     elif what_config == "restart_button":
         add_common_attributes(data, "mdi:restart", get_translation("system_restart"))
         data["command_topic"] = config.mqtt_discovery_prefix + "/update/" + hostname + "/command"
@@ -854,14 +1602,20 @@ def handle_specific_configurations(data, what_config, device):
         data["payload_press"] = "display_off"
     elif what_config == device + "_temp":
         add_common_attributes(data, "hass:thermometer", device + " " + get_translation("temperature"), "°C", "temperature", "measurement")
+    elif what_config.startswith("net_" + device + "_"):
+        icon, name, unit, device_class = NET_RATE_SENSORS[what_config[len("net_" + device + "_"):]]
+        add_common_attributes(data, icon, device + " " + name, unit, device_class, "measurement")
+    elif what_config.startswith(device + "_io_"):
+        icon, name, unit, device_class = DISK_IO_SENSORS[what_config[len(device + "_io_"):]]
+        add_common_attributes(data, icon, device + " " + name, unit, device_class, "measurement")
     elif what_config == device + "_ssd_health":
-        add_common_attributes(data, "mdi:harddisk", device + " SSD Health")
+        add_common_attributes(data, "mdi:harddisk", device + " " + _drive_kind(device) + " Health")
     elif what_config == device + "_ssd_wear":
-        add_common_attributes(data, "mdi:gauge", device + " SSD Wear", "%", None, "measurement")
+        add_common_attributes(data, "mdi:gauge", device + " " + _drive_kind(device) + " Wear", "%", None, "measurement")
     elif what_config == device + "_ssd_power_on_hours":
-        add_common_attributes(data, "mdi:timer-outline", device + " SSD Power-On Hours", "h", "duration", "total_increasing")
+        add_common_attributes(data, "mdi:timer-outline", device + " " + _drive_kind(device) + " Power-On Hours", "h", "duration", "total_increasing")
     elif what_config == device + "_ssd_data_written":
-        add_common_attributes(data, "mdi:database-arrow-up", device + " SSD Data Written", "TB", None, "total_increasing")
+        add_common_attributes(data, "mdi:database-arrow-up", device + " " + _drive_kind(device) + " Data Written", "TB", None, "total_increasing")
     elif what_config == "rpi_power_status":
         add_common_attributes(data, "mdi:flash", get_translation("rpi_power_status"))
     elif what_config == "apt_updates":
@@ -890,26 +1644,34 @@ def handle_specific_configurations(data, what_config, device):
         add_common_attributes(data, "mdi:speedometer", "Intel GPU Frequency", "MHz", "frequency", "measurement")
     elif what_config == "intel_gpu_power":
         add_common_attributes(data, "mdi:flash", "Intel GPU Power", "W", "power", "measurement")
-    elif what_config == "nvidia_gpu_util":
-        add_common_attributes(data, "mdi:expansion-card", "NVIDIA GPU Utilization", "%", None, "measurement")
-    elif what_config == "nvidia_gpu_mem":
-        add_common_attributes(data, "mdi:memory", "NVIDIA GPU Memory", "%", None, "measurement")
-    elif what_config == "nvidia_gpu_freq":
-        add_common_attributes(data, "mdi:speedometer", "NVIDIA GPU Frequency", "MHz", "frequency", "measurement")
-    elif what_config == "nvidia_gpu_power":
-        add_common_attributes(data, "mdi:flash", "NVIDIA GPU Power", "W", "power", "measurement")
-    elif what_config == "nvidia_gpu_temp":
-        add_common_attributes(data, "mdi:thermometer", "NVIDIA GPU Temperature", "°C", "temperature", "measurement")
-    elif what_config == "amd_gpu_util":
-        add_common_attributes(data, "mdi:expansion-card", "AMD GPU Utilization", "%", None, "measurement")
-    elif what_config == "amd_gpu_mem":
-        add_common_attributes(data, "mdi:memory", "AMD GPU Memory", "%", None, "measurement")
-    elif what_config == "amd_gpu_freq":
-        add_common_attributes(data, "mdi:speedometer", "AMD GPU Frequency", "MHz", "frequency", "measurement")
-    elif what_config == "amd_gpu_power":
-        add_common_attributes(data, "mdi:flash", "AMD GPU Power", "W", "power", "measurement")
-    elif what_config == "amd_gpu_temp":
-        add_common_attributes(data, "mdi:thermometer", "AMD GPU Temperature", "°C", "temperature", "measurement")
+    elif re.match(r"nvidia_gpu\d*_", what_config):
+        icon, name, unit, device_class = NVIDIA_GPU_SENSORS[what_config.split("_", 2)[2]]
+        label = "NVIDIA GPU" if device == "0" else "NVIDIA GPU " + device
+        add_common_attributes(data, icon, label + " " + name, unit, device_class, "measurement")
+    elif what_config.startswith("amd_gpu_"):
+        icon, name, unit, device_class = AMD_GPU_SENSORS[amd_gpu_metric(what_config, device)]
+        label = "AMD GPU" if device == "0" else "AMD GPU " + _pci_slot(device)
+        add_common_attributes(data, icon, label + " " + name, unit, device_class, "measurement")
+    elif what_config == "monitor_cycle_time":
+        add_common_attributes(data, "mdi:timer-outline", "Monitor Cycle Time", "s", "duration", "measurement")
+    elif what_config == "monitor_publish_time":
+        add_common_attributes(data, "mdi:timer-outline", "Monitor Publish Time", "s", "duration", "measurement")
+    elif what_config.startswith("monitor_collector_"):
+        add_common_attributes(data, "mdi:timer-outline", "Monitor " + device.replace('_', ' ').title() + " Time", "s", "duration", "measurement")
+    elif what_config == "monitor_messages":
+        add_common_attributes(data, "mdi:message-arrow-right-outline", "Monitor Messages Sent", None, None, "measurement")
+    elif what_config == "monitor_bytes":
+        add_common_attributes(data, "mdi:upload-network-outline", "Monitor Bytes Sent", "B", "data_size", "measurement")
+    elif what_config == "monitor_delivered":
+        add_common_attributes(data, "mdi:check-all", "Monitor Messages Delivered", None, None, "measurement")
+    elif what_config == "monitor_timed_out":
+        add_common_attributes(data, "mdi:timer-alert-outline", "Monitor Messages Timed Out", None, None, "measurement")
+    elif what_config == "monitor_failed":
+        add_common_attributes(data, "mdi:alert-circle-outline", "Monitor Messages Failed", None, None, "measurement")
+    elif what_config == "monitor_spawns":
+        add_common_attributes(data, "mdi:application-cog-outline", "Monitor Processes Spawned", None, None, "measurement")
+    elif what_config == "monitor_rss":
+        add_common_attributes(data, "mdi:memory", "Monitor Memory", "MiB", "data_size", "measurement")
 
 def config_json(what_config, device="0", hass_api=False):
     data = build_data_template(what_config)
@@ -921,6 +1683,9 @@ def config_json(what_config, device="0", hass_api=False):
         if config.use_availability:
             data["availability_topic"] = f"{data['state_topic']}_availability"
 
+    if getattr(config, "fast_sampling", False) and what_config in FastSampler.METRICS + ('rpi_power_status',):
+        data["json_attributes_topic"] = f"{data['state_topic']}_stats"
+
     if hass_api:
         result = {key: data[key] for key in ["name", "icon", "state_class", "unit_of_measurement", "device_class", "unique_id", "value_template"] if key in data}
         return result
@@ -928,6 +1693,150 @@ def config_json(what_config, device="0", hass_api=False):
     return json.dumps(data)
 
 
+# Discovery configs by (what_config, device, hass_api), built once and reused
+# until reset_discovery_cache() or until build_device_info() changes (new IP,
+# re-probed device facts), and the digest of the payload last published on
+# each discovery topic. Reset on every (re)connect and whenever Home
+# Assistant announces itself on <discovery_prefix>/status, so a restarted
+# broker or HA gets the full set again.
+_discovery_payloads = {}
+_discovery_sent = {}
+# build_device_info() the cached payloads were built with, and when it was
+# last compared with the current one (at most once a second, so once a cycle)
+_discovery_device = None
+_discovery_device_checked = 0
+
+
+def _check_discovery_device():
+    """Drop the cached discovery payloads when the device block they embed is
+    out of date."""
+    global _discovery_device, _discovery_device_checked
+    now = time.monotonic()
+    if now - _discovery_device_checked < 1:
+        return
+    _discovery_device_checked = now
+    device_info = build_device_info()
+    if device_info != _discovery_device:
+        _discovery_payloads.clear()
+        _discovery_device = device_info
+
+
+def discovery_payload(what_config, device="0", hass_api=False):
+    """Cached config_json(). The update entity is rebuilt every time because
+    it carries the latest remote version and its release notes."""
+    if what_config == "update":
+        return config_json(what_config, device, hass_api)
+    _check_discovery_device()
+    key = (what_config, device, hass_api)
+    payload = _discovery_payloads.get(key)
+    if payload is None:
+        payload = _discovery_payloads[key] = config_json(what_config, device, hass_api)
+    return payload
+
+
+# MQTTMessageInfo of the publishes made in this thread's mqtt_session()
+_tracked = threading.local()
+
+
+def mqtt_publish(client, topic, payload, qos=None, retain=False):
+    """client.publish() that counts what is sent; every publish goes through here.
+    Inside mqtt_session() the returned MQTTMessageInfo is also kept, and the
+    session waits for it on exit."""
+    info = client.publish(topic, payload, qos=config.qos if qos is None else qos, retain=retain)
+    if info.rc == paho.MQTT_ERR_SUCCESS:
+        size = 0 if payload is None else len(payload if isinstance(payload, bytes) else str(payload).encode("utf-8"))
+        count_sent(len(topic) + size)
+    infos = getattr(_tracked, "infos", None)
+    if infos is not None:
+        infos.append(info)
+    return info
+
+
+def publish_discovery(client, topic, payload, qos=None):
+    """Publish a discovery config unless this exact payload already went out on
+    topic since the last reset_discovery_cache()."""
+    digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    if _discovery_sent.get(topic) == digest:
+        return
+    info = mqtt_publish(client, topic, payload, qos=qos)
+    if info.rc == paho.MQTT_ERR_SUCCESS:
+        _discovery_sent[topic] = digest
+
+
+def reset_discovery_cache():
+    """Rebuild and republish every discovery config on the next cycle."""
+    _discovery_payloads.clear()
+    _discovery_sent.clear()
+
+
+# (payload, time) last published on each state topic, for publish_on_change.
+_last_published = {}
+# .on is set in this thread while forced_publish() is active
+_forced = threading.local()
+
+
+def _within_deadband(key, previous, value):
+    """True when value differs from previous by no more than the publish_deadband
+    entry for key: a number is an absolute band, a string like '5%' is relative
+    to previous. Non-numeric values must match exactly."""
+    if previous == value:
+        return True
+    band = (getattr(config, "publish_deadband", {}) or {}).get(key)
+    if band is None:
+        return False
+    try:
+        previous, value = float(previous), float(value)
+    except (TypeError, ValueError):
+        return False
+    if isinstance(band, str) and band.endswith('%'):
+        band = abs(previous) * float(band[:-1]) / 100
+    return abs(value - previous) <= float(band)
+
+
+def publish_heartbeat():
+    """Seconds after which an unchanged value is published anyway, by default
+    half of expire_after_time so Home Assistant never marks it unavailable."""
+    heartbeat = getattr(config, "publish_heartbeat", 0)
+    if heartbeat:
+        return heartbeat
+    return config.expire_after_time / 2 if config.expire_after_time else 3600
+
+
+@contextlib.contextmanager
+def forced_publish():
+    """Publish every state inside the block, bypassing the publish_on_change
+    filter; for the heartbeat resends of the CollectorScheduler, which decided
+    on its own clock that they are due."""
+    _forced.on = True
+    try:
+        yield
+    finally:
+        _forced.on = False
+
+
+def publish_state(client, topic, payload, retain=False):
+    """Publish a state or availability payload. With publish_on_change enabled,
+    a payload within the deadband of the last one published on topic (keyed by
+    the topic's last segment, e.g. cpu_temp) is skipped until the heartbeat is
+    due, unless inside forced_publish()."""
+    if getattr(config, "publish_on_change", False):
+        now = time.monotonic()
+        last = _last_published.get(topic)
+        if (last is not None and not getattr(_forced, "on", False) and now - last[1] < publish_heartbeat()
+                and _within_deadband(topic.rsplit('/', 1)[-1], last[0], payload)):
+            return
+        info = mqtt_publish(client, topic, payload, retain=retain)
+        if info.rc == paho.MQTT_ERR_SUCCESS:
+            _last_published[topic] = (payload, now)
+        return
+    mqtt_publish(client, topic, payload, retain=retain)
+
+
+def reset_publish_filter():
+    """Publish every value on the next cycle (after a reconnect)."""
+    _last_published.clear()
+
+
 def mqtt_transport():
     """Return the paho transport for the configured connection: "websockets" when
     mqtt_websockets is set, otherwise "tcp". Must be passed to the Client() constructor."""
@@ -949,6 +1858,16 @@ def configure_mqtt_connection(client):
             client.tls_insecure_set(True)
 
 
+def wait_for_mqtt_connection(client, max_wait=10):
+    """Poll until the client's network loop reports a connection, for at most
+    max_wait seconds. Returns True when connected."""
+    waited = 0
+    while not client.is_connected() and waited < max_wait:
+        time.sleep(0.2)
+        waited += 0.2
+    return client.is_connected()
+
+
 def create_mqtt_client():
 
     def on_log(client, userdata, level, buf):
@@ -973,12 +1892,7 @@ def create_mqtt_client():
         client.connect_async(config.mqtt_host, int(config.mqtt_port))
         client.loop_start()
         # Wait for connection or timeout
-        max_wait = 10  # seconds
-        waited = 0
-        while not client.is_connected() and waited < max_wait:
-            time.sleep(0.2)
-            waited += 0.2
-        if not client.is_connected():
+        if not wait_for_mqtt_connection(client):
             print("Error: MQTT connection timed out.")
             client.loop_stop()
             return None
@@ -992,41 +1906,313 @@ def create_mqtt_client():
     return client
 
 
-def publish_update_status_to_mqtt(git_update, apt_updates):
-    client = create_mqtt_client()
-    if client is None:
-        print("Error: Unable to connect to MQTT broker")
+def create_service_mqtt_client(on_connect):
+    """Create the long-lived client used by --service mode for the command topic
+    and for every periodic publish. connect_async + loop_start let paho keep
+    retrying (with backoff) if the broker is not reachable yet or drops later."""
+    status_topic = config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/status"
+    client = paho.Client(transport=mqtt_transport())
+    client.username_pw_set(config.mqtt_user, config.mqtt_password)
+    configure_mqtt_connection(client)
+    client.on_message = on_message
+    client.on_connect = on_connect
+    # set will_set to send a message when the client disconnects
+    client.will_set(status_topic, "0", qos=config.qos, retain=config.retain)
+    client.reconnect_delay_set(min_delay=1, max_delay=120)
+    client.connect_async(config.mqtt_host, int(config.mqtt_port))
+    client.loop_start()
+    return client
+
+
+def wait_for_delivery(infos, timeout=None):
+    """Wait for the MQTTMessageInfo of each publish to complete (acknowledged
+    for QoS 1/2, written to the socket for QoS 0), all within one deadline of
+    mqtt_publish_timeout seconds. Returns (delivered, timed_out, failed), which
+    are also added to the self_monitoring counters; failed publishes are the
+    ones paho did not accept (no connection, queue full)."""
+    if timeout is None:
+        timeout = float(getattr(config, "mqtt_publish_timeout", 10))
+    deadline = time.monotonic() + timeout
+    delivered = timed_out = failed = 0
+    for info in infos:
+        if info.rc != paho.MQTT_ERR_SUCCESS:
+            failed += 1
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            info.wait_for_publish(remaining)
+        if info.is_published():
+            delivered += 1
+        else:
+            timed_out += 1
+    count_delivery(delivered, timed_out, failed)
+    if timed_out or failed:
+        print("Warning: {} of {} messages not delivered within {}s ({} timed out, {} failed)".format(
+            timed_out + failed, len(infos), timeout, timed_out, failed))
+    return delivered, timed_out, failed
+
+
+@contextlib.contextmanager
+def delivery_tracking():
+    """Keep the MQTTMessageInfo of every mqtt_publish() made in this thread
+    inside the block, and wait_for_delivery() of them on exit."""
+    _tracked.infos = []
+    try:
+        yield
+    finally:
+        infos, _tracked.infos = _tracked.infos, None
+        if infos:
+            wait_for_delivery(infos)
+
+
+@contextlib.contextmanager
+def mqtt_session():
+    """Yield a connected MQTT client, or None when the broker is unreachable.
+
+    In --service mode this is the persistent client created at startup, so a
+    cycle costs no TCP/TLS handshake; if it is reconnecting we wait briefly and
+    skip the cycle rather than open a second connection. Otherwise (cron, -d)
+    a one-shot client is created and torn down on exit.
+
+    Before the session ends it waits for everything published in it, see
+    wait_for_delivery()."""
+    if mqtt_client is not None:
+        client = mqtt_client if wait_for_mqtt_connection(mqtt_client) else None
+    else:
+        client = create_mqtt_client()
+    try:
+        if client is None:
+            yield None
+        else:
+            with delivery_tracking():
+                yield client
+    finally:
+        # always tear down a one-shot network loop/connection, even if a publish raised
+        if client is not None and client is not mqtt_client:
+            client.loop_stop()
+            client.disconnect()
+
+
+_history = None
+
+
+def get_history(writable=True):
+    """The History of history_path when history is enabled, else None. -d opens
+    it read-only and gets None when the service has not written anything yet."""
+    global _history
+    if _history is None and getattr(config, "history", False):
+        directory = getattr(config, "history_path", "") or os.path.join(script_dir, "history")
+        if not writable and not os.path.isdir(directory):
+            return None
+        try:
+            _history = history_module.History(directory, writable)
+        except Exception as e:
+            print("Error opening history:", e)
+    return _history
+
+
+def record_history(monitored_values):
+    """Fold this cycle's numeric readings into the local history."""
+    history = get_history()
+    if history is None:
         return
     try:
-        _publish_update_status_to_mqtt(client, git_update, apt_updates)
+        history.record({entity.key: entity.value for entity in iter_entities(monitored_values)})
+    except Exception as e:
+        print("Error recording history:", e)
+
+
+# monitored_values keys exported as counters: key -> (metric name, help, field of
+# psutil.net_io_counters() to export instead of the rounded reading, or None)
+PROMETHEUS_COUNTERS = {
+    "data_sent": ("rpi_network_sent_bytes", "Bytes sent on all interfaces since boot", "bytes_sent"),
+    "data_received": ("rpi_network_received_bytes", "Bytes received on all interfaces since boot", "bytes_recv"),
+    "uptime_seconds": ("rpi_uptime_seconds", "Seconds since boot", None),
+}
+
+# per-device groups: monitored_values key -> (metric name prefix, label)
+PROMETHEUS_GROUPS = {
+    "disk_io": ("rpi_disk_io_", "device"),
+    "net_rates": ("rpi_net_", "interface"),
+    "nvidia_gpus": ("rpi_nvidia_gpu_", "gpu"),
+    "amd_gpus": ("rpi_amd_gpu_", "gpu"),
+}
+
+metrics_server = None
+
+
+def metric_families(monitored_values):
+    """monitored_values as exporter.render() families: numeric values become
+    rpi_<key> gauges, byte and uptime totals counters, and per-device readings
+    one family per metric with the drive, path, core, interface or GPU as label."""
+    families = {}
+    net_io = None
+
+    def add(name, kind, help_text, value, labels=None):
+        name = exporter.metric_name(name)
+        families.setdefault(name, (kind, help_text, []))[2].append((labels or {}, value))
+
+    for key, value in monitored_values.items():
+        if key in NON_STANDARD_VALUES:
+            continue
+        if key in PROMETHEUS_COUNTERS:
+            name, help_text, field = PROMETHEUS_COUNTERS[key]
+            if isinstance(value, (int, float)):
+                if field:
+                    # data_sent/data_received are rounded MB; export the exact byte counts
+                    net_io = net_io or psutil.net_io_counters()
+                    value = getattr(net_io, field)
+                add(name, "counter", help_text, value)
+        else:
+            add("rpi_" + key, "gauge", key.replace("_", " "), value)
+    for name, value in (monitored_values.get("used_space_paths") or {}).items():
+        add("rpi_used_space_path", "gauge", "used space of the used_space_paths entries in %", value, {"path": name})
+    for core, value in (monitored_values.get("cpu_load_per_core") or {}).items():
+        add("rpi_cpu_load_core", "gauge", "cpu load per core in %", value, {"core": core})
+    for drive, temp in (monitored_values.get("drive_temps") or {}).items():
+        add("rpi_drive_temp", "gauge", "drive temperature in degrees Celsius", temp, {"drive": drive})
+    for drive, metrics in (monitored_values.get("ssd_health") or {}).items():
+        labels = {"drive": drive}
+        if metrics.get("health") is not None:
+            add("rpi_ssd_health_passed", "gauge", "1 when the SMART overall health test passed", int(metrics["health"] == "PASSED"), labels)
+        if "wear" in metrics:
+            add("rpi_ssd_wear", "gauge", "drive life used in %", metrics["wear"], labels)
+        if "power_on_hours" in metrics:
+            add("rpi_ssd_power_on_hours", "counter", "hours the drive has been powered on", metrics["power_on_hours"], labels)
+        if "data_written" in metrics:
+            add("rpi_ssd_data_written_terabytes", "counter", "data written to the drive in TB", metrics["data_written"], labels)
+    for key, (prefix, label) in PROMETHEUS_GROUPS.items():
+        for device, metrics in (monitored_values.get(key) or {}).items():
+            for metric, value in metrics.items():
+                add(prefix + metric, "gauge", metric.replace("_", " "), value, {label: device})
+    for key, value in (monitored_values.get("self_monitoring") or {}).items():
+        if key.startswith("monitor_collector_"):
+            add("rpi_monitor_collector_seconds", "gauge", "collector wall time in the last cycle",
+                value, {"collector": key[len("monitor_collector_"):]})
+        else:
+            add("rpi_" + key, "gauge", key.replace("_", " "), value)
+    for item in monitored_values.get("ext_sensors") or []:
+        if item[1] == "ds18b20":
+            add("rpi_ext_sensor_temp", "gauge", "external sensor temperature in degrees Celsius", item[3], {"sensor": item[0]})
+        elif item[1] == "sht21" and item[3]:
+            add("rpi_ext_sensor_temp", "gauge", "external sensor temperature in degrees Celsius", item[3][0], {"sensor": item[0]})
+            add("rpi_ext_sensor_humidity", "gauge", "external sensor relative humidity in %", item[3][1], {"sensor": item[0]})
+    return families
+
+
+def update_metrics(monitored_values):
+    """Render the latest readings for the Prometheus endpoint; scrapes serve this text."""
+    if metrics_server is None:
+        return
+    try:
+        metrics_server.update(exporter.render(metric_families(monitored_values)))
+    except Exception as e:
+        print("Error rendering metrics:", e)
+
+
+_offline_buffer = None
+_replay_lock = threading.Lock()
+
+
+def get_offline_buffer():
+    """The OfflineBuffer when offline_buffer is enabled (opened on first use), else None."""
+    global _offline_buffer
+    if _offline_buffer is None and getattr(config, "offline_buffer", False):
+        import offline_buffer
+        path = getattr(config, "offline_buffer_path", "") or os.path.join(script_dir, "offline_buffer.db")
+        _offline_buffer = offline_buffer.OfflineBuffer(path, getattr(config, "offline_buffer_max_rows", 10000))
+    return _offline_buffer
+
+
+def history_topic():
+    """Topic buffered readings are replayed on, one timestamped JSON snapshot per message."""
+    return config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/history"
+
+
+def buffer_readings(monitored_values):
+    """The broker is unreachable: keep this cycle's readings for replay."""
+    buffer = get_offline_buffer()
+    if buffer is None:
+        return
+    try:
+        buffer.store({entity.key: entity.value for entity in iter_entities(monitored_values)})
+    except Exception as e:
+        print("Error buffering readings:", e)
+
+
+def replay_offline_buffer(client, max_time=None):
+    """Publish the buffered readings on history_topic(), oldest first and at most
+    offline_buffer_replay_rate per second (QoS 1 at least). A snapshot is removed
+    once the broker has acknowledged it, so an interrupted replay resumes later."""
+    buffer = get_offline_buffer()
+    if buffer is None or not _replay_lock.acquire(blocking=False):
+        return
+    try:
+        if not buffer.pending():
+            return
+
+        def deliver(payloads):
+            infos = [mqtt_publish(client, history_topic(), payload, qos=max(1, config.qos)) for payload in payloads]
+            delivered = 0
+            for info in infos:
+                if info.rc != paho.MQTT_ERR_SUCCESS:
+                    break
+                info.wait_for_publish(10)
+                if not info.is_published():
+                    break
+                delivered += 1
+            return delivered
+
+        replayed = buffer.replay(deliver, getattr(config, "offline_buffer_replay_rate", 10),
+                                 stop=stop_event.is_set, max_time=max_time)
+        if replayed:
+            print("Replayed {} buffered snapshots, {} left".format(replayed, buffer.pending()))
+    except Exception as e:
+        print("Error replaying buffered readings:", e)
     finally:
-        client.loop_stop()
-        client.disconnect()
+        _replay_lock.release()
+
+
+def replay_in_background(client):
+    """Start replaying buffered readings after a successful publish. The service
+    connection replays from its own thread; a one-shot (cron) client gets at
+    most half a minute before it is torn down, the rest waits for the next run."""
+    buffer = get_offline_buffer()
+    if buffer is None:
+        return
+    if client is mqtt_client:
+        if not _replay_lock.locked():
+            threading.Thread(target=replay_offline_buffer, args=(client,), name="offline-replay", daemon=True).start()
+    else:
+        replay_offline_buffer(client, max_time=30)
+
+
+def publish_update_status_to_mqtt(git_update, apt_updates):
+    with mqtt_session() as client:
+        if client is None:
+            print("Error: Unable to connect to MQTT broker")
+            return
+        _publish_update_status_to_mqtt(client, git_update, apt_updates)
 
 
 def _publish_update_status_to_mqtt(client, git_update, apt_updates):
     if config.git_update:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/binary_sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_git_update/config",
-                           config_json('git_update'), qos=config.qos)
-        client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/git_update", git_update, qos=1, retain=config.retain)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/binary_sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_git_update/config",
+                           discovery_payload('git_update'), qos=config.qos)
+        mqtt_publish(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/git_update", git_update, qos=1, retain=config.retain)
 
     if config.update:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/update/" + hostname + "/config",
-                           config_json('update'), qos=1)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/update/" + hostname + "/config",
+                           discovery_payload('update'), qos=1)
 
     if config.apt_updates:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_apt_updates/config",
-                           config_json('apt_updates'), qos=config.qos)
-        client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/apt_updates", apt_updates, qos=config.qos, retain=config.retain)
-
+            publish_discovery(client, config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_apt_updates/config",
+                           discovery_payload('apt_updates'), qos=config.qos)
+        mqtt_publish(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/apt_updates", apt_updates, retain=config.retain)
 
-    # Wait for all messages to be delivered
-    while len(client._out_messages) > 0:
-        time.sleep(0.1)
-        client.loop()
 
 
 def publish_update_progress(client, in_progress, new_ver, percentage=None):
@@ -1046,103 +2232,213 @@ def publish_update_progress(client, in_progress, new_ver, percentage=None):
             "in_progress": bool(in_progress),
             "update_percentage": percentage,
         }
-        client.publish(
-            config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/git_update",
+        mqtt_publish(
+            client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/git_update",
             json.dumps(payload), qos=1, retain=config.retain)
     except Exception as e:
         print("Could not publish update progress state:", e)
 
 
-def publish_to_hass_api(monitored_values):
+_hass_session = None
+_hass_session_lock = threading.Lock()
+# (digest of state + attributes, time) of the last successful post per entity
+_hass_sent = {}
+
+
+def hass_session():
+    """Keep-alive requests session for the Home Assistant API, with a connection
+    pool sized for hass_api_concurrency, so a cycle pays for one TCP/TLS
+    handshake instead of one per entity. Created once, under a lock, as
+    publishes run on several threads."""
+    global _hass_session
+    with _hass_session_lock:
+        if _hass_session is None:
+            workers = max(1, int(getattr(config, "hass_api_concurrency", 4)))
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {config.hass_token}",
+                "Content-Type": "application/json"
+            })
+            _hass_session = session
+        return _hass_session
+
+
+def _hass_updates(monitored_values):
+    """(entity_id, state, attributes) of every entity in monitored_values."""
+    updates = []
     for param, value in monitored_values.items():
         if value:
             if param == 'drive_temps' and isinstance(value, dict):
                 for device, temp in value.items():
                     entity_id = f"sensor.{hostname.replace('-','_')}_{device}_temp"
                     state = temp
-                    attributes = config_json(device + "_temp", device, True)
-                    send_sensor_data_to_home_assistant(entity_id, state, attributes)
+                    attributes = discovery_payload(device + "_temp", device, True)
+                    updates.append((entity_id, state, attributes))
             elif param == 'ssd_health' and isinstance(value, dict):
                 for device, metrics in value.items():
                     for metric, mval in metrics.items():
                         key = device + "_ssd_" + metric
                         entity_id = f"sensor.{hostname.replace('-','_')}_{key}"
-                        attributes = config_json(key, device, True)
-                        send_sensor_data_to_home_assistant(entity_id, mval, attributes)
+                        attributes = discovery_payload(key, device, True)
+                        updates.append((entity_id, mval, attributes))
+            elif param == 'fast_stats':
+                # min/max/mean/p95 are only published as MQTT JSON attributes
+                continue
+            elif param in ('self_monitoring', 'nvidia_gpus', 'amd_gpus', 'disk_io', 'net_rates'):
+                for key, device, mval in grouped_sensor_entities({param: value}):
+                    entity_id = f"sensor.{hostname.replace('-','_')}_{key}"
+                    attributes = discovery_payload(key, device, True)
+                    updates.append((entity_id, mval, attributes))
+            elif param == 'cpu_load_per_core' and isinstance(value, dict):
+                for core, load in value.items():
+                    entity_id = f"sensor.{hostname.replace('-','_')}_cpu_load_core{core}"
+                    attributes = discovery_payload("cpu_load_core" + core, core, True)
+                    updates.append((entity_id, load, attributes))
             elif param == 'used_space_paths' and isinstance(value, dict):
                 for name, used in value.items():
                     entity_id = f"sensor.{hostname.replace('-','_')}_used_space_{name}"
-                    attributes = config_json("used_space_" + name, name, True)
-                    send_sensor_data_to_home_assistant(entity_id, used, attributes)
+                    attributes = discovery_payload("used_space_" + name, name, True)
+                    updates.append((entity_id, used, attributes))
             else:
                 entity_id = f"sensor.{hostname.replace('-','_')}_{param}"
                 state = value
-                attributes = config_json(param, "0", True)
-                send_sensor_data_to_home_assistant(entity_id, state, attributes)
+                attributes = discovery_payload(param, "0", True)
+                updates.append((entity_id, state, attributes))
+    return updates
+
+
+def publish_to_hass_api(monitored_values, heartbeat_values=None):
+    """Post monitored_values, and the scheduler's heartbeat_values, which are
+    posted even when unchanged (see forced_publish())."""
+    # Skip entities whose state and attributes match the last successful post,
+    # unless the heartbeat is due, then post the rest concurrently over the
+    # pooled keep-alive session.
+    updates = [update + (False,) for update in _hass_updates(monitored_values)]
+    updates += [update + (True,) for update in _hass_updates(heartbeat_values or {})]
+    now = time.monotonic()
+    pending = []
+    for entity_id, state, attributes, force in updates:
+        digest = hashlib.sha1(json.dumps([state, attributes], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        last = _hass_sent.get(entity_id)
+        if force or last is None or last[0] != digest or now - last[1] >= publish_heartbeat():
+            pending.append((entity_id, state, attributes, digest))
+    if not pending:
+        return
+
+    def send(update):
+        entity_id, state, attributes, digest = update
+        if send_sensor_data_to_home_assistant(entity_id, state, attributes):
+            _hass_sent[entity_id] = (digest, now)
+
+    workers = max(1, int(getattr(config, "hass_api_concurrency", 4)))
+    daemon_map(send, pending, workers)
 
 
 def send_sensor_data_to_home_assistant(entity_id, state, attributes):
+    """POST one entity state; returns True when Home Assistant accepted it."""
     home_assistant_url = config.hass_host
-    api_token = config.hass_token
     url = f"{home_assistant_url}/api/states/{entity_id}"
-    headers = {
-        "Authorization": f"Bearer {api_token}",
-        "Content-Type": "application/json"
-    }
     data = {
         "state": state,
         "attributes": attributes
     }
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = hass_session().post(url, json=data, timeout=10)
     except requests.RequestException as e:
         print(f"Failed to update {entity_id}: {e}")
-        return
+        return False
     if response.status_code in [200, 201]:
-        pass
+        count_sent(len(response.request.body or b""))
+        return True
     else:
         print(f"Failed to update {entity_id}: {response.status_code} - {response.text}")
+        return False
 
 
-def publish_to_mqtt(monitored_values):
-    client = create_mqtt_client()
-    if client is None:
-        return
-    try:
+def publish_to_mqtt(monitored_values, heartbeat_values=None):
+    """Publish monitored_values, and the scheduler's heartbeat_values inside
+    forced_publish()."""
+    with mqtt_session() as client:
+        if client is None:
+            buffer_readings({**monitored_values, **(heartbeat_values or {})})
+            return
         _publish_to_mqtt(client, monitored_values)
-    finally:
-        # always tear down the network loop/connection, even if a publish raised
-        client.loop_stop()
-        client.disconnect()
+        if heartbeat_values:
+            with forced_publish():
+                _publish_to_mqtt(client, heartbeat_values)
+        replay_in_background(client)
 
 
-def _publish_to_mqtt(client, monitored_values):
-    non_standard_values = ['restart_button', 'shutdown_button', 'display_control', 'drive_temps', 'ssd_health', 'ext_sensors', 'used_space_paths', 'custom_scripts']
-  # Publish standard monitored values
+# monitored_values keys that are not a single sensor value
+NON_STANDARD_VALUES = ['restart_button', 'shutdown_button', 'display_control', 'drive_temps', 'ssd_health', 'ext_sensors', 'used_space_paths', 'custom_scripts', 'cpu_load_per_core', 'fast_stats', 'self_monitoring', 'nvidia_gpus', 'amd_gpus', 'disk_io', 'net_rates']
+
+Entity = collections.namedtuple('Entity', ['key', 'what_config', 'device', 'value', 'object_id'])
+
+
+def self_monitoring_entities(values):
+    """(key, device, value) of each self_monitoring sensor; collector times
+    use the collector name as device."""
+    for key, value in (values or {}).items():
+        device = key[len("monitor_collector_"):] if key.startswith("monitor_collector_") else "0"
+        yield key, device, value
+
+
+def grouped_sensor_entities(monitored_values):
+    """(key, device, value) of the sensors kept in dict groups of
+    monitored_values: self_monitoring, the NVIDIA and AMD GPUs after the first,
+    disk I/O and network rates."""
+    yield from self_monitoring_entities(monitored_values.get("self_monitoring"))
+    yield from nvidia_gpu_entities(monitored_values.get("nvidia_gpus"))
+    yield from amd_gpu_entities(monitored_values.get("amd_gpus"))
+    yield from disk_io_entities(monitored_values.get("disk_io"))
+    yield from net_rate_entities(monitored_values.get("net_rates"))
+
+
+def iter_entities(monitored_values):
+    """Flatten monitored_values into one Entity per Home Assistant sensor:
+    key names its state topic / JSON field, what_config and device are the
+    config_json() arguments and object_id is used in the discovery topic."""
     for key, value in monitored_values.items():
-        if key not in non_standard_values and key in config.__dict__ and config.__dict__[key]:
-            if config.discovery_messages:
-                client.publish(f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
-                            config_json(key), qos=config.qos)
-            if config.use_availability:
-                client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability", 'offline' if value is None else 'online', qos=config.qos)
-            client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}", value, qos=config.qos, retain=config.retain)
+        if key not in NON_STANDARD_VALUES:
+            yield Entity(key, key, "0", value, key)
+    for name, value in (monitored_values.get("used_space_paths") or {}).items():
+        yield Entity("used_space_" + name, "used_space_" + name, name, value, "used_space_" + name)
+    for core, value in (monitored_values.get("cpu_load_per_core") or {}).items():
+        yield Entity("cpu_load_core" + core, "cpu_load_core" + core, core, value, "cpu_load_core" + core)
+    for device, temp in (monitored_values.get("drive_temps") or {}).items():
+        yield Entity(device + "_temp", device + "_temp", device, temp, device + "_temp")
+    for device, metrics in (monitored_values.get("ssd_health") or {}).items():
+        for metric, value in metrics.items():
+            key = device + "_ssd_" + metric
+            yield Entity(key, key, device, value, key)
+    for key, device, value in grouped_sensor_entities(monitored_values):
+        yield Entity(key, key, device, value, key)
+    for item in monitored_values.get("ext_sensors") or []:
+        if item[1] == "ds18b20":
+            yield Entity("ds18b20_status_" + item[0], "ds18b20_status", item[0], item[3], item[0] + "_status")
+        if item[1] == "sht21":
+            yield Entity("sht21_temp_status_" + item[0], "sht21_temp_status", item[0], item[3][0], item[0] + "_temp_status")
+            yield Entity("sht21_hum_status_" + item[0], "sht21_hum_status", item[0], item[3][1], item[0] + "_hum_status")
+
 
-  # Publish non standard values    
+def _publish_button_discovery(client):
     if config.restart_button:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_restart/config",
-                           config_json('restart_button'), qos=config.qos)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_restart/config",
+                           discovery_payload('restart_button'), qos=config.qos)
     if config.shutdown_button:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_shutdown/config",
-                           config_json('shutdown_button'), qos=config.qos)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_shutdown/config",
+                           discovery_payload('shutdown_button'), qos=config.qos)
     if config.display_control:
         if config.discovery_messages:
-            client.publish(config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_display_on/config",
-                           config_json('display_on'), qos=config.qos)
-            client.publish(config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_display_off/config",
-                           config_json('display_off'), qos=config.qos)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_display_on/config",
+                           discovery_payload('display_on'), qos=config.qos)
+            publish_discovery(client, config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix + "/" + hostname + "_display_off/config",
+                           discovery_payload('display_off'), qos=config.qos)
     if getattr(config, 'custom_scripts', None):
         for script_path, icon, payload in config.custom_scripts:
             key = "custom_script_" + re.sub(r'[^a-zA-Z0-9_-]', '_', payload)
@@ -1155,45 +2451,87 @@ def _publish_to_mqtt(client, monitored_values):
                     "unique_id": hostname + "_" + key,
                     "device": build_device_info(),
                 }
-                client.publish(
-                    config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix
+                publish_discovery(
+                    client, config.mqtt_discovery_prefix + "/button/" + config.mqtt_topic_prefix
                     + "/" + hostname + "_" + key + "/config",
                     json.dumps(data), qos=config.qos)
+
+
+def _publish_to_mqtt(client, monitored_values):
+  # Publish standard monitored values
+    for key, value in monitored_values.items():
+        if key not in NON_STANDARD_VALUES and key in config.__dict__ and config.__dict__[key]:
+            if config.discovery_messages:
+                publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
+                            discovery_payload(key), qos=config.qos)
+            if config.use_availability:
+                publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability", 'offline' if value is None else 'online')
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}", value, retain=config.retain)
+
+  # Publish non standard values
+    _publish_button_discovery(client)
+    if "cpu_load_per_core" in monitored_values:
+        for core, value in monitored_values["cpu_load_per_core"].items():
+            key = "cpu_load_core" + core
+            if config.discovery_messages:
+                publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
+                               discovery_payload(key, core), qos=config.qos)
+            if config.use_availability:
+                publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
+                                      'offline' if value is None else 'online')
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
+                                  value, retain=config.retain)
+
     if "used_space_paths" in monitored_values:
         for name, value in monitored_values["used_space_paths"].items():
             key = "used_space_" + name
             if config.discovery_messages:
-                client.publish(f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
-                               config_json(key, name), qos=config.qos)
+                publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
+                               discovery_payload(key, name), qos=config.qos)
             if config.use_availability:
-                client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
-                               'offline' if value is None else 'online', qos=config.qos)
-            client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
-                           value, qos=config.qos, retain=config.retain)
+                publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
+                                      'offline' if value is None else 'online')
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
+                                  value, retain=config.retain)
 
-    if config.drive_temps:
+    for key, device, value in grouped_sensor_entities(monitored_values):
+        if config.discovery_messages:
+            publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
+                           discovery_payload(key, device), qos=config.qos)
+        if config.use_availability:
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
+                                  'offline' if value is None else 'online')
+        publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
+                              value, retain=config.retain)
+
+    for key, stats in monitored_values.get("fast_stats", {}).items():
+        # JSON attributes of the matching sensor, see config_json()
+        publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_stats",
+                      json.dumps(stats), retain=config.retain)
+
+    if config.drive_temps and "drive_temps" in monitored_values:
         for device, temp in monitored_values['drive_temps'].items():
             if config.discovery_messages:
-                client.publish(config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_" + device + "_temp/config",
-                           config_json(device + "_temp", device), qos=config.qos)
+                publish_discovery(client, config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_" + device + "_temp/config",
+                           discovery_payload(device + "_temp", device), qos=config.qos)
             if config.use_availability:
-                client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{device}_temp_availability", 'offline' if temp is None else 'online', qos=config.qos)
-            client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + device + "_temp", temp, qos=config.qos, retain=config.retain)
+                publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{device}_temp_availability", 'offline' if temp is None else 'online')
+            publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + device + "_temp", temp, retain=config.retain)
 
     if getattr(config, "ssd_health", False) and "ssd_health" in monitored_values:
         for device, metrics in monitored_values["ssd_health"].items():
             for metric, value in metrics.items():
                 key = device + "_ssd_" + metric
                 if config.discovery_messages:
-                    client.publish(f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
-                                   config_json(key, device), qos=config.qos)
+                    publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{key}/config",
+                                   discovery_payload(key, device), qos=config.qos)
                 if config.use_availability:
-                    client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
-                                   'offline' if value is None else 'online', qos=config.qos)
-                client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
-                               value, qos=config.qos, retain=config.retain)
+                    publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}_availability",
+                                          'offline' if value is None else 'online')
+                publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/{key}",
+                                      value, retain=config.retain)
 
-    if config.ext_sensors:
+    if config.ext_sensors and "ext_sensors" in monitored_values:
         # we loop through all sensors
         for item in monitored_values['ext_sensors']:
             # item[0] = name
@@ -1202,58 +2540,112 @@ def _publish_to_mqtt(client, monitored_values):
             # item[3] = value, like temperature or humidity
             if item[1] == "ds18b20":
                 if config.discovery_messages:
-                    client.publish(
+                    publish_discovery(client, 
                         config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_" + item[0] + "_status/config",
-                        config_json('ds18b20_status', device=item[0]), qos=config.qos)
+                        discovery_payload('ds18b20_status', device=item[0]), qos=config.qos)
                 if config.use_availability:
-                    client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/ds18b20_status_{item[0]}_availability", 'offline' if item[3] is None else 'online', qos=config.qos)
-                client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "ds18b20_status_" + item[0], item[3], qos=config.qos, retain=config.retain)
+                    publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/ds18b20_status_{item[0]}_availability", 'offline' if item[3] is None else 'online')
+                publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "ds18b20_status_" + item[0], item[3], retain=config.retain)
             if item[1] == "sht21":
                 if config.discovery_messages:
                     # temperature
-                    client.publish(
+                    publish_discovery(client, 
                         config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_" + item[0] + "_temp_status/config",
-                        config_json('sht21_temp_status', device=item[0]), qos=config.qos)
+                        discovery_payload('sht21_temp_status', device=item[0]), qos=config.qos)
                     # humidity
-                    client.publish(
+                    publish_discovery(client, 
                         config.mqtt_discovery_prefix + "/sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_" + item[0] + "_hum_status/config",
-                        config_json('sht21_hum_status', device=item[0]), qos=config.qos)
+                        discovery_payload('sht21_hum_status', device=item[0]), qos=config.qos)
                 if config.use_availability:
-                    client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/sht21_temp_status_{item[0]}_availability", 'offline' if item[3][0] is None else 'online', qos=config.qos)
-                    client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/sht21_hum_status_{item[0]}_availability", 'offline' if item[3][1] is None else 'online', qos=config.qos)
+                    publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/sht21_temp_status_{item[0]}_availability", 'offline' if item[3][0] is None else 'online')
+                    publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/sht21_hum_status_{item[0]}_availability", 'offline' if item[3][1] is None else 'online')
                 # temperature
-                client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "sht21_temp_status_" + item[0], item[3][0], qos=config.qos, retain=config.retain)
+                publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "sht21_temp_status_" + item[0], item[3][0], retain=config.retain)
                 # humidity
-                client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "sht21_hum_status_" + item[0], item[3][1], qos=config.qos, retain=config.retain)
+                publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/" + "sht21_hum_status_" + item[0], item[3][1], retain=config.retain)
                 
     status_sensor_topic = config.mqtt_discovery_prefix + "/binary_sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_status/config"
-    client.publish(status_sensor_topic, config_json('status'), qos=config.qos)
-    client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/status", "1", qos=config.qos, retain=config.retain)
+    publish_discovery(client, status_sensor_topic, discovery_payload('status'), qos=config.qos)
+    publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/status", "1", retain=config.retain)
 
     if "data_sent" in monitored_values:
         if config.discovery_messages:
-            client.publish(f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_data_sent/config",
-                           config_json("data_sent"), qos=config.qos)
+            publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_data_sent/config",
+                           discovery_payload("data_sent"), qos=config.qos)
         if config.use_availability:
-            client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_sent_availability", 'offline' if monitored_values["data_sent"] is None else 'online', qos=config.qos)
-        client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_sent",
-                       monitored_values["data_sent"], qos=config.qos, retain=config.retain)
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_sent_availability", 'offline' if monitored_values["data_sent"] is None else 'online')
+        publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_sent",
+                              monitored_values["data_sent"], retain=config.retain)
 
     if "data_received" in monitored_values:
         if config.discovery_messages:
-            client.publish(f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_data_received/config",
-                           config_json("data_received"), qos=config.qos)
+            publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_data_received/config",
+                           discovery_payload("data_received"), qos=config.qos)
         if config.use_availability:
-            client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_received_availability", 'offline' if monitored_values["data_received"] is None else 'online', qos=config.qos)
-        client.publish(f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_received",
-                       monitored_values["data_received"], qos=config.qos, retain=config.retain)
-    
-    while len(client._out_messages) > 0:
-        time.sleep(0.1)
-        client.loop()
+            publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_received_availability", 'offline' if monitored_values["data_received"] is None else 'online')
+        publish_state(client, f"{config.mqtt_uns_structure}{config.mqtt_topic_prefix}/{hostname}/data_received",
+                              monitored_values["data_received"], retain=config.retain)
+
+
+def json_state_topic():
+    return config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/state"
+
+
+def json_discovery_payload(entity):
+    """Discovery config for an entity in JSON state mode: the regular config,
+    pointed at the shared JSON state topic with a value_template that picks
+    the entity's field (and its fast-sampling stats, if any)."""
+    _check_discovery_device()
+    cache_key = (entity.what_config, entity.device, "json")
+    payload = _discovery_payloads.get(cache_key)
+    if payload is not None:
+        return payload
+    data = json.loads(config_json(entity.what_config, entity.device))
+    field = "value_json['{}']".format(entity.key)
+    data["state_topic"] = json_state_topic()
+    if "value_template" in data:
+        data["value_template"] = re.sub(r'\bvalue\b', field, data["value_template"])
+    else:
+        data["value_template"] = "{{ " + field + " }}"
+    if "availability_topic" in data:
+        data["availability_topic"] = json_state_topic()
+        data["availability_template"] = "{{ 'offline' if " + field + " is none else 'online' }}"
+    if "json_attributes_topic" in data:
+        data["json_attributes_topic"] = json_state_topic()
+        data["json_attributes_template"] = "{{ value_json.get('stats', {}).get('" + entity.key + "', {}) | tojson }}"
+    payload = _discovery_payloads[cache_key] = json.dumps(data)
+    return payload
+
+
+def _publish_json_state(client, monitored_values):
+    """group_messages_format = 'json': every sensor in one JSON object on
+    json_state_topic(), with discovery configs that parse it."""
+    state = {}
+    for entity in iter_entities(monitored_values):
+        state[entity.key] = entity.value
+        if config.discovery_messages:
+            publish_discovery(client, f"{config.mqtt_discovery_prefix}/sensor/{config.mqtt_topic_prefix}/{hostname}_{entity.object_id}/config",
+                              json_discovery_payload(entity), qos=config.qos)
+    if monitored_values.get("fast_stats"):
+        state["stats"] = monitored_values["fast_stats"]
+    _publish_button_discovery(client)
+
+    status_sensor_topic = config.mqtt_discovery_prefix + "/binary_sensor/" + config.mqtt_topic_prefix + "/" + hostname + "_status/config"
+    publish_discovery(client, status_sensor_topic, discovery_payload('status'), qos=config.qos)
+    publish_state(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname + "/status", "1", retain=config.retain)
+    mqtt_publish(client, json_state_topic(), json.dumps(state), retain=config.retain)
 
 
 def bulk_publish_to_mqtt(monitored_values):
+    if getattr(config, "group_messages_format", "csv") == "json":
+        with mqtt_session() as client:
+            if client is None:
+                buffer_readings(monitored_values)
+                return
+            _publish_json_state(client, monitored_values)
+            replay_in_background(client)
+        return
+
     values = [monitored_values.get(key, 0) for key in [
         'cpu_load', 'cpu_temp', 'used_space', 'voltage', 'sys_clock_speed', 'swap', 'memory', 'uptime', 'uptime_seconds',
         'wifi_signal', 'wifi_signal_dbm', 'rpi5_fan_speed', 'git_update', 'rpi_power_status', 'data_sent', 'data_received',
@@ -1267,19 +2659,12 @@ def bulk_publish_to_mqtt(monitored_values):
     values.extend(sensor[3] for sensor in ext_sensors)
     values_str = ', '.join('' if v is None else str(v) for v in values)
 
-    client = create_mqtt_client()
-    if client is None:
-        return
-
-    try:
-        client.publish(config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname, values_str, qos=config.qos, retain=config.retain)
-
-        while len(client._out_messages) > 0:
-            time.sleep(0.1)
-            client.loop()
-    finally:
-        client.loop_stop()
-        client.disconnect()
+    with mqtt_session() as client:
+        if client is None:
+            buffer_readings(monitored_values)
+            return
+        mqtt_publish(client, config.mqtt_uns_structure + config.mqtt_topic_prefix + "/" + hostname, values_str, retain=config.retain)
+        replay_in_background(client)
 
 
 def parse_arguments():
@@ -1295,8 +2680,15 @@ def parse_arguments():
     parser.add_argument('-w', '--hass_wake', action='store_true', help='display Home assistant wake on lan configuration', default=False)
     parser.add_argument('-c', '--config', action='store_true', help='open the interactive TUI configurator and exit', default=False)
     parser.add_argument('--uninstall', action='store_true', help='uninstall rpi-mqtt-monitor and remove all related files')
+    parser.add_argument('--benchmark', nargs='?', const='benchmark_' + hostname + '.json', metavar='FILE',
+                        help='time every collector and the publish path, print a table, write a JSON report (default: benchmark_<hostname>.json, - for stdout) and exit')
     args = parser.parse_args()
 
+    if args.benchmark:
+        import benchmark
+        benchmark.run(sys.modules[__name__], args.benchmark)
+        exit()
+
     if args.config:
         import configurator
         configurator.run(os.path.join(script_dir, 'config.py'),
@@ -1332,42 +2724,184 @@ def parse_arguments():
       data:
         topic: "{}/update/{}/command"
         payload: "shutdown"
-    """.format(get_mac_address(), get_network_ip(), hostname, config.mqtt_discovery_prefix, hostname )
+    """.format(device_facts()["mac"], get_network_ip(), hostname, config.mqtt_discovery_prefix, hostname )
         print(hass_config)
         exit()
 
     return args
 
 
-def _parse_intel_gpu_json(out):
-    """Parse intel_gpu_top -J output into the most recent sample dict, or None."""
-    out = (out or "").strip()
-    if not out:
-        return None
-    try:
-        data = json.loads(out)
-    except json.JSONDecodeError:
-        # -J streams concatenated objects / an unterminated array when interrupted.
-        # Extract the LAST complete top-level {...} object (most recent sample).
-        last, depth, start = None, 0, None
-        for i, ch in enumerate(out):
-            if ch == '{':
-                if depth == 0:
-                    start = i
+class JsonStream:
+    """Incremental parser for a stream of JSON objects, as printed by
+    `intel_gpu_top -J`: a (never closed) array of samples on newer versions,
+    back-to-back objects on older ones. feed() returns the objects completed
+    by the new text; an incomplete one stays buffered for the next call, and
+    one that is complete but invalid is dropped whole, so parsing resumes at
+    the next top-level object rather than inside it."""
+
+    MAX_BUFFER = 1 << 20
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+
+    @staticmethod
+    def _object_end(buffer):
+        """Index just past the object buffer starts with, by bracket depth
+        outside strings, or None while it is incomplete."""
+        depth = 0
+        in_string = escaped = False
+        for i, c in enumerate(buffer):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == '\\':
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c in '{[':
                 depth += 1
-            elif ch == '}':
+            elif c in '}]':
                 depth -= 1
-                if depth == 0 and start is not None:
-                    last = out[start:i + 1]
-        if last is None:
-            return None
-        try:
-            data = json.loads(last)
-        except json.JSONDecodeError:
-            return None
-    if isinstance(data, list):
-        data = data[-1] if data else {}
-    return data if isinstance(data, dict) else None
+                if depth <= 0:
+                    return i + 1
+        return None
+
+    def feed(self, text):
+        self._buffer += text
+        objects = []
+        while True:
+            buffer = self._buffer.lstrip(" \t\r\n,[]")
+            if not buffer:
+                self._buffer = ""
+                break
+            if buffer[0] != "{":
+                # stray text between samples: skip to the next object
+                next_object = buffer.find("{")
+                self._buffer = buffer[next_object:] if next_object > 0 else ""
+                continue
+            try:
+                obj, end = self._decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                end = self._object_end(buffer)
+                if end is not None:
+                    # complete but not valid JSON: drop it whole
+                    self._buffer = buffer[end:]
+                    continue
+                # incomplete; an object that never closes is given up on
+                self._buffer = buffer if len(buffer) <= self.MAX_BUFFER else ""
+                break
+            self._buffer = buffer[end:]
+            objects.append(obj)
+        return objects
+
+
+def _parse_intel_gpu_json(out):
+    """Parse intel_gpu_top -J output into the most recent sample dict, or None."""
+    samples = [obj for obj in JsonStream().feed(out or "") if isinstance(obj, dict)]
+    return samples[-1] if samples else None
+
+
+def _average_samples(samples):
+    """Average the numeric leaves of same-shaped intel_gpu_top samples; other
+    values come from the newest sample."""
+    latest = samples[-1]
+    if isinstance(latest, dict):
+        return {key: _average_samples([s[key] for s in samples if isinstance(s, dict) and key in s])
+                for key in latest}
+    if isinstance(latest, (int, float)) and not isinstance(latest, bool):
+        numbers = [s for s in samples if isinstance(s, (int, float))]
+        return sum(numbers) / len(numbers)
+    return latest
+
+
+class IntelGpuReader:
+    """One long-lived `intel_gpu_top -J -s <ms>` child for --service mode,
+    instead of a new process every cycle. A thread parses its stream and keeps
+    the samples of the last intel_gpu_average seconds; sample() returns their
+    average from memory. The child is restarted (with backoff) when it exits
+    and terminated on stop_event or stop()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = collections.deque()
+        self._last_sample = 0
+        self._process = None
+        self._thread = None
+
+    def interval_ms(self):
+        return max(100, int(getattr(config, "intel_gpu_interval", 1000)))
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="intel-gpu-top", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _run(self):
+        backoff = 5
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self._stream()
+            except Exception as e:
+                print("intel_gpu_top reader error:", e)
+            finally:
+                self.stop()
+                self._process = None
+            if time.monotonic() - started > 60:
+                backoff = 5
+            if stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, 300)
+
+    def _stream(self):
+        self._process = process = subprocess.Popen(
+            ["sudo", "-n", "intel_gpu_top", "-J", "-s", str(self.interval_ms())],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        parser = JsonStream()
+        fd = process.stdout.fileno()
+        while not stop_event.is_set():
+            readable, _, _ = select.select([fd], [], [], 1)
+            if not readable:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return  # the child exited
+            samples = [obj for obj in parser.feed(chunk.decode("utf-8", "replace")) if isinstance(obj, dict)]
+            if samples:
+                self._add(samples)
+
+    def _add(self, samples):
+        keep = max(1, int(getattr(config, "intel_gpu_average", 10) * 1000 / self.interval_ms()))
+        with self._lock:
+            self._samples.extend(samples)
+            while len(self._samples) > keep:
+                self._samples.popleft()
+            self._last_sample = time.monotonic()
+
+    def sample(self):
+        """The averaged recent sample, or None when the stream has gone quiet."""
+        with self._lock:
+            if not self._samples or time.monotonic() - self._last_sample > 3 * self.interval_ms() / 1000 + 5:
+                return None
+            samples = list(self._samples)
+        return _average_samples(samples)
+
+
+intel_gpu_reader = IntelGpuReader()
 
 
 def get_intel_gpu_stats():
@@ -1377,7 +2911,13 @@ def get_intel_gpu_stats():
 
     Fast path uses `-n 1` (print one sample and exit). Older intel-gpu-tools lack
     `-n`; for those, fall back to running without it, bounding the run with the
-    `timeout` command (SIGINT, like Ctrl-C) and parsing the streamed sample."""
+    `timeout` command (SIGINT, like Ctrl-C) and parsing the streamed sample.
+    In --service mode the averaged sample from intel_gpu_reader is used while
+    its stream is alive."""
+    if intel_gpu_reader.is_running():
+        data = intel_gpu_reader.sample()
+        if data:
+            return data
     # Fast path: modern intel_gpu_top prints one sample and exits immediately.
     try:
         out = subprocess.run(
@@ -1429,200 +2969,573 @@ def _intel_gpu_value(gpu, path, ndigits, fallback_path=None):
     return None if config.use_availability else 0
 
 
-def get_nvidia_gpu_stats():
-    """Read NVIDIA GPU stats via pynvml (nvidia-ml-py). No root required.
-    Returns a dict of metric->value, or None if pynvml/the driver is unavailable so the
-    monitor degrades gracefully on non-NVIDIA hosts."""
-    pynvml = None
-    try:
-        import pynvml
-        pynvml.nvmlInit()
-        handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-        util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-        mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        stats = {
-            "util": round(util.gpu, 1),
-            "mem": round(mem.used / mem.total * 100, 1) if mem.total else 0,
-            "freq": pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_SM),
-            "power": round(pynvml.nvmlDeviceGetPowerUsage(handle) / 1000, 2),
-            "temp": pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU),
-        }
-        return stats
-    except Exception:
-        return None
-    finally:
+# NVIDIA metric -> (icon, name, unit, device_class); config flag nvidia_gpu_<metric>
+NVIDIA_GPU_SENSORS = {
+    "util": ("mdi:expansion-card", "Utilization", "%", None),
+    "mem": ("mdi:memory", "Memory", "%", None),
+    "freq": ("mdi:speedometer", "Frequency", "MHz", "frequency"),
+    "power": ("mdi:flash", "Power", "W", "power"),
+    "temp": ("mdi:thermometer", "Temperature", "°C", "temperature"),
+    "enc": ("mdi:movie-open-cog", "Encoder", "%", None),
+    "dec": ("mdi:movie-open-play", "Decoder", "%", None),
+    "pcie_tx": ("mdi:upload", "PCIe TX", "MB/s", "data_rate"),
+    "pcie_rx": ("mdi:download", "PCIe RX", "MB/s", "data_rate"),
+}
+
+
+class NvmlSession:
+    """NVML initialised once for the life of the process, with a cached handle
+    per GPU; nvmlShutdown() runs at exit. When pynvml or the driver is missing,
+    initialisation is retried every RETRY seconds rather than every cycle; an
+    NVML error on a GPU closes the session, which is reopened RETRY seconds
+    later."""
+
+    RETRY = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pynvml = None
+        self._handles = []
+        self._failed_at = None
+        self._atexit = False
+
+    def _open(self):
+        if self._pynvml is not None:
+            return True
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY:
+            return False
         try:
-            if pynvml is not None:
-                pynvml.nvmlShutdown()
+            import pynvml
+            pynvml.nvmlInit()
+            self._handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
         except Exception:
-            pass
+            self._failed_at = time.monotonic()
+            return False
+        self._pynvml = pynvml
+        if not self._atexit:
+            atexit.register(self.shutdown)
+            self._atexit = True
+        return True
+
+    def _close(self):
+        if self._pynvml is not None:
+            try:
+                self._pynvml.nvmlShutdown()
+            except Exception:
+                pass
+        self._pynvml = None
+        self._handles = []
+
+    def shutdown(self):
+        with self._lock:
+            self._close()
+
+    def _read(self, handle, metrics):
+        pynvml = self._pynvml
+
+        def memory():
+            mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            return round(mem.used / mem.total * 100, 1) if mem.total else 0
+
+        def pcie(counter):
+            return round(pynvml.nvmlDeviceGetPcieThroughput(handle, counter) / 1024, 1)  # KB/s -> MB/s
+
+        readers = {
+            "util": lambda: round(pynvml.nvmlDeviceGetUtilizationRates(handle).gpu, 1),
+            "mem": memory,
+            "freq": lambda: pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_SM),
+            "power": lambda: round(pynvml.nvmlDeviceGetPowerUsage(handle) / 1000, 2),
+            "temp": lambda: pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU),
+            "enc": lambda: pynvml.nvmlDeviceGetEncoderUtilization(handle)[0],
+            "dec": lambda: pynvml.nvmlDeviceGetDecoderUtilization(handle)[0],
+            "pcie_tx": lambda: pcie(pynvml.NVML_PCIE_UTIL_TX_BYTES),
+            "pcie_rx": lambda: pcie(pynvml.NVML_PCIE_UTIL_RX_BYTES),
+        }
+        # a GPU that fell off the bus fails here and resets the session
+        pynvml.nvmlDeviceGetUtilizationRates(handle)
+        stats = {}
+        for metric in metrics:
+            try:
+                stats[metric] = readers[metric]()
+            except pynvml.NVMLError:
+                stats[metric] = None  # e.g. not supported on this GPU
+        return stats
+
+    def stats(self, metrics):
+        """[{metric: value}] for every GPU in NVML index order, or None when
+        NVML is unavailable."""
+        with self._lock:
+            if not self._open():
+                return None
+            try:
+                return [self._read(handle, metrics) for handle in self._handles]
+            except Exception as e:
+                print("Error reading NVIDIA GPU stats:", e)
+                self._close()
+                self._failed_at = time.monotonic()
+                return None
+
+
+nvml_session = NvmlSession()
+
+
+def get_nvidia_gpu_stats(metrics=tuple(NVIDIA_GPU_SENSORS)):
+    """Read NVIDIA GPU stats via pynvml (nvidia-ml-py). No root required.
+    Returns a list with a dict of metric->value per GPU, or None if pynvml/the
+    driver is unavailable so the monitor degrades gracefully on non-NVIDIA hosts."""
+    return nvml_session.stats(metrics)
+
+
+def nvidia_gpu_entities(gpus):
+    """(key, device, value) of the sensors of GPUs 1 and up; GPU 0 keeps the
+    plain nvidia_gpu_<metric> keys."""
+    for index, stats in (gpus or {}).items():
+        for metric, value in stats.items():
+            yield "nvidia_gpu{}_{}".format(index, metric), index, value
 
 
 def _read_sysfs_num(path, scale=1, ndigits=0):
     """Read a single number from a sysfs file, apply scale, and round.
     Returns None on any failure so callers can fall back to availability handling."""
     try:
-        with open(path) as f:
-            value = float(f.read().strip()) * scale
+        value = float(sysfs_index.read(path)) * scale
         return round(value, ndigits) if ndigits else int(value)
     except Exception:
         return None
 
 
 def _read_cpu_voltage_hwmon():
-    """CPU core voltage (V) from hwmon Super-I/O sensors on non-Pi hardware.
-    Scans /sys/class/hwmon/*/in*_input and picks the input whose *_label looks
-    like a CPU core rail (Vcore / CPU). Returns None if none is exposed."""
-    try:
-        for hwmon in sorted(glob.glob('/sys/class/hwmon/hwmon*')):
-            for inp in sorted(glob.glob(os.path.join(hwmon, 'in*_input'))):
-                label_path = inp[:-len('_input')] + '_label'
-                try:
-                    with open(label_path) as f:
-                        label = f.read().strip().lower()
-                except Exception:
-                    continue
-                if 'vcore' in label or 'cpu' in label:
-                    return _read_sysfs_num(inp, 1e-3, 3)  # mV -> V
-    except Exception:
-        pass
-    return None
-
-
-def _amd_gpu_device():
-    """Return the /sys/class/drm/cardN/device path of the first amdgpu card, or None."""
-    try:
-        for card in sorted(glob.glob("/sys/class/drm/card[0-9]*/device")):
-            driver = os.path.join(card, "driver")
-            if os.path.islink(driver) and os.path.basename(os.readlink(driver)) == "amdgpu":
-                return card
-    except Exception:
-        pass
-    return None
+    """CPU core voltage (V) from hwmon Super-I/O sensors on non-Pi hardware: the
+    in*_input whose *_label looks like a CPU core rail (Vcore / CPU), located by
+    sysfs_index. Returns None if none is exposed."""
+    vcore = sysfs_index.get()['vcore']
+    return _read_sysfs_num(vcore, 1e-3, 3) if vcore else None  # mV -> V
+
+
+# AMD metric -> (icon, name, unit, device_class); config flag amd_gpu_<metric>
+AMD_GPU_SENSORS = {
+    "util": ("mdi:expansion-card", "Utilization", "%", None),
+    "mem": ("mdi:memory", "Memory", "%", None),
+    "freq": ("mdi:speedometer", "Frequency", "MHz", "frequency"),
+    "power": ("mdi:flash", "Power", "W", "power"),
+    "temp": ("mdi:thermometer", "Temperature", "°C", "temperature"),
+    "temp_junction": ("mdi:thermometer-high", "Junction Temperature", "°C", "temperature"),
+    "temp_mem": ("mdi:thermometer", "Memory Temperature", "°C", "temperature"),
+    "vram_used": ("mdi:memory", "VRAM Used", "B", "data_size"),
+    "fan": ("mdi:fan", "Fan Speed", "RPM", None),
+    "power_cap": ("mdi:flash-outline", "Power Cap", "W", "power"),
+}
+
+
+def _read_amd_gpu(card, metrics):
+    """Read the requested metrics of one amdgpu card (a sysfs_index entry)."""
+    device, hwmon = card['device'], card['hwmon']
+
+    def hwmon_num(name, scale=1, ndigits=0):
+        return _read_sysfs_num(os.path.join(hwmon, name), scale, ndigits) if hwmon else None
+
+    def freq():
+        value = hwmon_num("freq1_input", 1e-6)
+        return value if value is not None else _amd_pp_dpm_sclk(os.path.join(device, "pp_dpm_sclk"))
+
+    def power():
+        # power1_average on older kernels, power1_input on newer ones
+        value = hwmon_num("power1_average", 1e-6, 2)
+        return value if value is not None else hwmon_num("power1_input", 1e-6, 2)
+
+    def temp(label):
+        path = card['temps'].get(label)
+        return _read_sysfs_num(path, 1e-3, 1) if path else None
+
+    readers = {
+        "util": lambda: _read_sysfs_num(os.path.join(device, "gpu_busy_percent")),
+        "mem": lambda: _read_sysfs_num(os.path.join(device, "mem_busy_percent")),
+        "freq": freq,
+        "power": power,
+        "temp": lambda: temp('edge'),
+        "temp_junction": lambda: temp('junction'),
+        "temp_mem": lambda: temp('mem'),
+        "vram_used": lambda: _read_sysfs_num(os.path.join(device, "mem_info_vram_used")),
+        "fan": lambda: hwmon_num("fan1_input"),
+        "power_cap": lambda: hwmon_num("power1_cap", 1e-6, 1),
+    }
+    return {metric: readers[metric]() for metric in metrics}
 
 
-def get_amd_gpu_stats():
+def get_amd_gpu_stats(metrics=tuple(AMD_GPU_SENSORS)):
     """Read AMD GPU stats from sysfs (in-kernel amdgpu driver). No tools, no root.
-    Returns a dict of metric->value, or None if no amdgpu card is present."""
-    device = _amd_gpu_device()
-    if not device:
-        return None
-    try:
-        hwmons = glob.glob(os.path.join(device, "hwmon", "hwmon*"))
-        hwmon = hwmons[0] if hwmons else None
-        freq = _read_sysfs_num(os.path.join(hwmon, "freq1_input"), 1e-6, 0) if hwmon else None
-        if freq is None:
-            freq = _amd_pp_dpm_sclk(os.path.join(device, "pp_dpm_sclk"))
-        return {
-            "util": _read_sysfs_num(os.path.join(device, "gpu_busy_percent")),
-            "mem": _read_sysfs_num(os.path.join(device, "mem_busy_percent")),
-            "freq": freq,
-            "power": _read_sysfs_num(os.path.join(hwmon, "power1_average"), 1e-6, 2) if hwmon else None,
-            "temp": _read_sysfs_num(os.path.join(hwmon, "temp1_input"), 1e-3, 1) if hwmon else None,
-        }
-    except Exception:
+    Returns [(PCI slot, {metric: value})] for every amdgpu card, or None if there
+    is none. Only the requested files are read, through already-open descriptors
+    (see SysfsIndex), so every extra card costs a few pread() calls."""
+    cards = sysfs_index.get()['amd_gpus']
+    if not cards:
         return None
+    return [(card['slot'], _read_amd_gpu(card, metrics)) for card in cards]
+
+
+def _pci_slot(device):
+    """'0000_03_00_0' (a slot used in sensor keys) -> '0000:03:00.0'."""
+    parts = device.split("_")
+    return "{}:{}:{}.{}".format(*parts) if len(parts) == 4 else device
+
+
+def amd_gpu_metric(key, device):
+    """The AMD_GPU_SENSORS metric of a sensor key (amd_gpu_<metric> for the
+    first card, amd_gpu_<slot>_<metric> for the others)."""
+    prefix = "amd_gpu_" if device == "0" else "amd_gpu_" + device + "_"
+    return key[len(prefix):]
+
+
+def amd_gpu_entities(gpus):
+    """(key, device, value) of the sensors of every amdgpu card after the
+    first, keyed by PCI slot; the first card keeps amd_gpu_<metric>."""
+    for slot, stats in (gpus or {}).items():
+        for metric, value in stats.items():
+            yield "amd_gpu_{}_{}".format(slot, metric), slot, value
 
 
 def _amd_pp_dpm_sclk(path):
     """Parse the active core-clock (marked with '*') from pp_dpm_sclk, e.g. '1: 800Mhz *'.
     The leading 'N:' is the DPM index, so read the digits from the token carrying the unit."""
     try:
-        with open(path) as f:
-            for line in f:
-                if "*" in line:
-                    for token in line.split():
-                        if "hz" in token.lower():
-                            digits = "".join(c for c in token if c.isdigit())
-                            if digits:
-                                return int(digits)
+        for line in (sysfs_index.read(path) or "").splitlines():
+            if "*" in line:
+                for token in line.split():
+                    if "hz" in token.lower():
+                        digits = "".join(c for c in token if c.isdigit())
+                        if digits:
+                            return int(digits)
     except Exception:
         pass
     return None
 
 
-def collect_monitored_values():
-    monitored_values = {}
+Collector = collections.namedtuple('Collector', ['name', 'func', 'fallback'])
 
-    if config.cpu_load:
-        monitored_values["cpu_load"] = check_cpu_load()
+
+def build_collectors():
+    """Return the enabled collectors, in publish order. Each func() returns a
+    {key: value} fragment of monitored_values; fallback is the fragment used
+    when the collector fails or misses its deadline."""
+    na = None if config.use_availability else 0
+    collectors = []
+
+    def add(name, func, fallback):
+        collectors.append(Collector(name, func, fallback))
+
+    def add_value(key, func, *func_args):
+        add(key, lambda: {key: func(*func_args)}, {key: na})
+
+    cpu_keys = [k for k in ("cpu_load", "cpu_user", "cpu_system", "cpu_iowait", "cpu_steal")
+                if getattr(config, k, False)]
+    if cpu_keys or getattr(config, "cpu_load_per_core", False):
+        fallback = {k: na for k in cpu_keys}
+        if getattr(config, "cpu_load_per_core", False):
+            fallback["cpu_load_per_core"] = {}
+        add("cpu_load", check_cpu_stats, fallback)
     if config.cpu_temp:
-        monitored_values["cpu_temp"] = check_cpu_temp()
+        add_value("cpu_temp", check_cpu_temp)
     if config.used_space:
-        monitored_values["used_space"] = check_used_space(config.used_space_path)
-    extra_space = {}
-    for entry in getattr(config, "used_space_paths", []) or []:
-        slug = _slugify(entry.get("name") or entry.get("path"))
-        extra_space[slug] = check_used_space(entry["path"])
-    if extra_space:
-        monitored_values["used_space_paths"] = extra_space
+        add_value("used_space", check_used_space, config.used_space_path)
+    extra_paths = getattr(config, "used_space_paths", []) or []
+    if extra_paths:
+        def used_space_paths():
+            extra_space = {}
+            for entry in extra_paths:
+                slug = _slugify(entry.get("name") or entry.get("path"))
+                extra_space[slug] = check_used_space(entry["path"])
+            return {"used_space_paths": extra_space}
+        add("used_space_paths", used_space_paths,
+            {"used_space_paths": {_slugify(e.get("name") or e.get("path")): na for e in extra_paths}})
     if config.voltage:
-        monitored_values["voltage"] = check_voltage()
+        add_value("voltage", check_voltage)
     if config.sys_clock_speed:
-        monitored_values["sys_clock_speed"] = check_sys_clock_speed()
+        add_value("sys_clock_speed", check_sys_clock_speed)
     if config.swap:
-        monitored_values["swap"] = check_swap()
+        add_value("swap", check_swap)
     if config.memory:
-        monitored_values["memory"] = check_memory()
+        add_value("memory", check_memory)
     if config.uptime:
-        monitored_values["uptime"] = check_uptime('timestamp')
+        add_value("uptime", check_uptime, 'timestamp')
     if config.uptime_seconds:
-        monitored_values["uptime_seconds"] = check_uptime('')
+        add_value("uptime_seconds", check_uptime, '')
     if config.wifi_signal:
-        monitored_values["wifi_signal"] = check_wifi_signal('')
+        add_value("wifi_signal", check_wifi_signal, '')
     if config.wifi_signal_dbm:
-        monitored_values["wifi_signal_dbm"] = check_wifi_signal('dbm')
+        add_value("wifi_signal_dbm", check_wifi_signal, 'dbm')
     if config.rpi5_fan_speed:
-        monitored_values["rpi5_fan_speed"] = check_rpi5_fan_speed()
+        add_value("rpi5_fan_speed", check_rpi5_fan_speed)
     if getattr(config, "local_ipv4", False):
-        monitored_values["local_ipv4"] = get_network_ip()
+        add_value("local_ipv4", get_network_ip)
     if getattr(config, "local_ipv6", False):
-        monitored_values["local_ipv6"] = get_local_ipv6()
+        add_value("local_ipv6", get_local_ipv6)
     if getattr(config, "external_ipv4", False):
-        monitored_values["external_ipv4"] = get_external_ip(4)
+        add_value("external_ipv4", get_external_ip, 4)
     if getattr(config, "external_ipv6", False):
-        monitored_values["external_ipv6"] = get_external_ip(6)
+        add_value("external_ipv6", get_external_ip, 6)
     if config.drive_temps:
-        monitored_values["drive_temps"] = check_all_drive_temps()
+        add("drive_temps", lambda: {"drive_temps": check_all_drive_temps()}, {"drive_temps": {}})
+    if getattr(config, "disk_io", False):
+        add("disk_io", lambda: {"disk_io": check_disk_io()}, {"disk_io": {}})
     if getattr(config, "ssd_health", False):
-        monitored_values["ssd_health"] = check_all_ssd_health()
+        add("ssd_health", lambda: {"ssd_health": check_all_ssd_health()}, {"ssd_health": {}})
     if config.rpi_power_status:
-        monitored_values["rpi_power_status"] = check_rpi_power_status()
+        add_value("rpi_power_status", check_rpi_power_status)
+    if getattr(config, "fast_sampling", False) and fast_sampler.is_running():
+        add("fast_stats", lambda: {"fast_stats": fast_sampler.take_window()}, {"fast_stats": {}})
+    if getattr(config, "self_monitoring", False):
+        add("self_monitoring", lambda: {"self_monitoring": self_monitoring_values()}, {"self_monitoring": {}})
     if config.ext_sensors:
-        monitored_values["ext_sensors"] = read_ext_sensors()
+        # on timeout keep the previous readings stored in config.ext_sensors
+        add("ext_sensors", lambda: {"ext_sensors": read_ext_sensors()}, {"ext_sensors": config.ext_sensors})
     if config.net_io:
-        data_sent, data_received = get_network_data()
-        monitored_values["data_sent"] = data_sent
-        monitored_values["data_received"] = data_received
-    if (getattr(config, "intel_gpu_render", False) or getattr(config, "intel_gpu_video", False)
-            or getattr(config, "intel_gpu_freq", False) or getattr(config, "intel_gpu_power", False)):
-        gpu = get_intel_gpu_stats() or {}
-        if getattr(config, "intel_gpu_render", False):
-            monitored_values["intel_gpu_render"] = _intel_gpu_engine_busy(gpu, "Render")
-        if getattr(config, "intel_gpu_video", False):
-            monitored_values["intel_gpu_video"] = _intel_gpu_engine_busy(gpu, "Video")
-        if getattr(config, "intel_gpu_freq", False):
-            monitored_values["intel_gpu_freq"] = _intel_gpu_value(gpu, ["frequency", "actual"], 0)
-        if getattr(config, "intel_gpu_power", False):
-            monitored_values["intel_gpu_power"] = _intel_gpu_value(gpu, ["power", "GPU"], 2, ["power", "Package"])
-    nvidia_keys = ["util", "mem", "freq", "power", "temp"]
-    if any(getattr(config, "nvidia_gpu_" + k, False) for k in nvidia_keys):
-        gpu = get_nvidia_gpu_stats() or {}
-        for k in nvidia_keys:
-            if getattr(config, "nvidia_gpu_" + k, False):
-                value = gpu.get(k)
-                monitored_values["nvidia_gpu_" + k] = value if value is not None else (None if config.use_availability else 0)
-    amd_keys = ["util", "mem", "freq", "power", "temp"]
-    if any(getattr(config, "amd_gpu_" + k, False) for k in amd_keys):
-        gpu = get_amd_gpu_stats() or {}
-        for k in amd_keys:
-            if getattr(config, "amd_gpu_" + k, False):
-                value = gpu.get(k)
-                monitored_values["amd_gpu_" + k] = value if value is not None else (None if config.use_availability else 0)
-
+        def net_io():
+            data_sent, data_received = get_network_data()
+            return {"data_sent": data_sent, "data_received": data_received}
+        add("net_io", net_io, {"data_sent": na, "data_received": na})
+    if getattr(config, "net_rates", False):
+        add("net_rates", lambda: {"net_rates": check_net_rates()}, {"net_rates": {}})
+    intel_keys = [k for k in ("intel_gpu_render", "intel_gpu_video", "intel_gpu_freq", "intel_gpu_power")
+                  if getattr(config, k, False)]
+    if intel_keys:
+        def intel_gpu():
+            gpu = get_intel_gpu_stats() or {}
+            values = {
+                "intel_gpu_render": lambda: _intel_gpu_engine_busy(gpu, "Render"),
+                "intel_gpu_video": lambda: _intel_gpu_engine_busy(gpu, "Video"),
+                "intel_gpu_freq": lambda: _intel_gpu_value(gpu, ["frequency", "actual"], 0),
+                "intel_gpu_power": lambda: _intel_gpu_value(gpu, ["power", "GPU"], 2, ["power", "Package"]),
+            }
+            return {k: values[k]() for k in intel_keys}
+        add("intel_gpu", intel_gpu, {k: na for k in intel_keys})
+    nvidia_keys = [k for k in NVIDIA_GPU_SENSORS if getattr(config, "nvidia_gpu_" + k, False)]
+    if nvidia_keys:
+        def nvidia_gpu():
+            gpus = [{k: na if v is None else v for k, v in gpu.items()}
+                    for gpu in get_nvidia_gpu_stats(nvidia_keys) or [{}]]
+            values = {"nvidia_gpu_" + k: gpus[0].get(k, na) for k in nvidia_keys}
+            values["nvidia_gpus"] = {str(index): gpu for index, gpu in enumerate(gpus) if index}
+            return values
+        fallback = {"nvidia_gpu_" + k: na for k in nvidia_keys}
+        fallback["nvidia_gpus"] = {}
+        add("nvidia_gpu", nvidia_gpu, fallback)
+    amd_keys = [k for k in AMD_GPU_SENSORS if getattr(config, "amd_gpu_" + k, False)]
+    if amd_keys:
+        def amd_gpu():
+            cards = [(_slugify(slot), {k: na if v is None else v for k, v in gpu.items()})
+                     for slot, gpu in get_amd_gpu_stats(amd_keys) or [("", {})]]
+            values = {"amd_gpu_" + k: cards[0][1].get(k, na) for k in amd_keys}
+            values["amd_gpus"] = dict(cards[1:])
+            return values
+        fallback = {"amd_gpu_" + k: na for k in amd_keys}
+        fallback["amd_gpus"] = {}
+        add("amd_gpu", amd_gpu, fallback)
+
+    return collectors
+
+
+# Collector threads by name. A collector that overran its deadline keeps running
+# in the background; it is not started again until that run has finished.
+_collector_threads = {}
+# Wall time in seconds of each collector's last run; one that timed out or is
+# still running reports how long it has been going so far.
+collector_times = {}
+_collector_started = {}
+
+
+def run_collectors(collectors):
+    """Run collectors concurrently and merge their fragments in table order."""
+    monitored_values = {}
+    for fragment in run_collector_fragments(collectors)[0].values():
+        monitored_values.update(fragment)
     return monitored_values
 
 
+def run_collector_fragments(collectors):
+    """Run collectors concurrently, at most collector_workers at a time, and
+    return ({name: fragment} in table order, names of the failed ones). Every collector must finish within
+    collector_timeout seconds of getting a worker slot (collector_timeouts can
+    override this per collector name), so time spent queued behind slow ones
+    does not count. One that fails, overruns or is still busy from an earlier
+    cycle contributes its fallback instead and counts as failed; an overrunning
+    collector gives its
+    slot up to the queued ones and finishes in the background."""
+    workers = max(1, int(getattr(config, "collector_workers", 4)))
+    default_timeout = getattr(config, "collector_timeout", 20)
+    timeouts = getattr(config, "collector_timeouts", {}) or {}
+    slots = threading.Semaphore(workers)
+    # all under cond: name -> monotonic time the slot was taken; collectors
+    # that finished; collectors whose slot is back in the pool
+    cond = threading.Condition()
+    acquired, done, released = {}, set(), set()
+    results = {}
+
+    def release(name):
+        # called with cond held; a slot is given back exactly once
+        if name not in released:
+            released.add(name)
+            slots.release()
+
+    def run(collector):
+        slots.acquire()
+        with cond:
+            acquired[collector.name] = _collector_started[collector.name] = time.monotonic()
+            cond.notify_all()
+        try:
+            results[collector.name] = collector.func()
+        except Exception as e:
+            print("Error in collector {}: {}".format(collector.name, e))
+        finally:
+            with cond:
+                collector_times[collector.name] = round(time.monotonic() - acquired[collector.name], 3)
+                done.add(collector.name)
+                release(collector.name)
+                cond.notify_all()
+
+    threads = {}
+    for collector in collectors:
+        previous = _collector_threads.get(collector.name)
+        if previous is not None and previous.is_alive():
+            print("Collector {} is still running from an earlier cycle, skipping".format(collector.name))
+            if collector.name in _collector_started:
+                collector_times[collector.name] = round(time.monotonic() - _collector_started[collector.name], 3)
+            continue
+        thread = threading.Thread(target=run, args=(collector,), name="collector-" + collector.name, daemon=True)
+        _collector_threads[collector.name] = threads[collector.name] = thread
+        thread.start()
+
+    timed_out = set()
+    with cond:
+        while True:
+            now = time.monotonic()
+            deadlines = {}
+            for name in threads:
+                if name in done or name in timed_out or name not in acquired:
+                    continue
+                deadline = acquired[name] + timeouts.get(name, default_timeout)
+                if deadline <= now:
+                    print("Collector {} timed out".format(name))
+                    collector_times[name] = round(now - acquired[name], 3)
+                    timed_out.add(name)
+                    release(name)
+                else:
+                    deadlines[name] = deadline
+            if all(name in done or name in timed_out for name in threads):
+                break
+            # collectors still queued get a slot as soon as one is released,
+            # which wakes us up; otherwise sleep until the nearest deadline
+            cond.wait(min(deadlines.values()) - now if deadlines else None)
+        fragments, failed = {}, set()
+        for collector in collectors:
+            if collector.name in done and collector.name in results:
+                fragments[collector.name] = results[collector.name]
+            else:
+                fragments[collector.name] = collector.fallback
+                failed.add(collector.name)
+
+    return fragments, failed
+
+
+class CollectorScheduler:
+    """Runs each collector on its own cadence: collector_intervals[name]
+    seconds (default service_sleep_time), varied by +/- collector_jitter so a
+    fleet started together drifts apart. collect() returns all the latest
+    values, for the grouped message and the display, and what to publish:
+    the fresh fragments, and separately the cached ones due for a heartbeat so
+    Home Assistant does not expire them. The heartbeat values are published
+    with forced_publish(), as the publish_on_change filter stamps its own
+    heartbeat when a value is sent, later than this one. A collector that
+    fails keeps its last good fragment (its fallback only when it never had
+    one) and is retried after service_sleep_time rather than its own,
+    possibly long, interval."""
+
+    def __init__(self):
+        self._next_run = {}
+        # name -> [fragment, monotonic time it was last published]
+        self._fragments = {}
+
+    def interval(self, name):
+        intervals = getattr(config, "collector_intervals", {}) or {}
+        return intervals.get(name, config.service_sleep_time)
+
+    def collect(self, collectors):
+        now = time.monotonic()
+        due = [c for c in collectors if self._next_run.get(c.name, 0) <= now + 0.5]
+        fresh, failed = run_collector_fragments(due)
+        # one factor per cycle, so collectors that ran together stay together
+        jitter = getattr(config, "collector_jitter", 0.1)
+        factor = 1 + random.uniform(-jitter, jitter)
+        for collector in due:
+            interval = config.service_sleep_time if collector.name in failed else self.interval(collector.name)
+            self._next_run[collector.name] = now + interval * factor
+
+        monitored_values, publish_values, heartbeat_values = {}, {}, {}
+        for collector in collectors:
+            if collector.name in failed and collector.name in self._fragments:
+                fresh.pop(collector.name)
+            if collector.name in fresh:
+                self._fragments[collector.name] = [fresh[collector.name], now]
+                publish_values.update(fresh[collector.name])
+            elif collector.name in self._fragments:
+                cached = self._fragments[collector.name]
+                if now - cached[1] >= publish_heartbeat():
+                    cached[1] = now
+                    heartbeat_values.update(cached[0])
+            else:
+                continue
+            monitored_values.update(self._fragments[collector.name][0])
+        return monitored_values, publish_values, heartbeat_values
+
+    def next_due(self):
+        """Monotonic time of the next collector run or heartbeat."""
+        times = list(self._next_run.values())
+        times += [published + publish_heartbeat() for _, published in self._fragments.values()]
+        return min(times) if times else time.monotonic() + config.service_sleep_time
+
+    def republish_all(self):
+        """Publish every cached value again on the next cycle."""
+        for cached in self._fragments.values():
+            cached[1] = float('-inf')
+
+
+collector_scheduler = CollectorScheduler()
+
+
+# Timings of the last completed cycle, see record_cycle()
+_last_cycle = {}
+
+
+def record_cycle(cycle_time, publish_time, spawns):
+    _last_cycle.update(cycle_time=round(cycle_time, 3), publish_time=round(publish_time, 3), spawns=spawns,
+                       collectors=dict(collector_times))
+
+
+def self_monitoring_values():
+    """The monitor's own cost: cycle, publish and collector wall times and
+    processes spawned in the previous cycle, messages and bytes sent and MQTT
+    messages delivered / timed out / failed since the previous reading, and the
+    current RSS of this process."""
+    messages, sent_bytes = sent_count(reset=True)
+    values = {}
+    if _last_cycle:
+        values["monitor_cycle_time"] = _last_cycle["cycle_time"]
+        values["monitor_publish_time"] = _last_cycle["publish_time"]
+        values["monitor_spawns"] = _last_cycle["spawns"]
+    values["monitor_messages"] = messages
+    values["monitor_bytes"] = sent_bytes
+    for outcome, count in delivery_count(reset=True).items():
+        values["monitor_" + outcome] = count
+    values["monitor_rss"] = round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    for name, elapsed in _last_cycle.get("collectors", {}).items():
+        if name != "self_monitoring":
+            values["monitor_collector_" + name] = elapsed
+    return values
+
+
+def collect_monitored_values():
+    return run_collectors(build_collectors())
+
+
 def get_network_data():
     net_io = psutil.net_io_counters()
     data_sent = net_io.bytes_sent / (1024 * 1024)  # Convert bytes to megabytes
@@ -1630,67 +3543,257 @@ def get_network_data():
     return round(data_sent, 2), round(data_received, 2)
 
 
+def read_net_counters():
+    """{interface: (bytes recv, bytes sent, packets recv, packets sent, errors,
+    drops)} from psutil; errors and drops are in + out. These are the raw
+    kernel counters (nowrap=False), unsigned long in the kernel's
+    net_device_stats: CounterSampler handles wraps, and a reset interface
+    counts as no traffic rather than a spike."""
+    return {nic: (c.bytes_recv, c.bytes_sent, c.packets_recv, c.packets_sent, c.errin + c.errout, c.dropin + c.dropout)
+            for nic, c in psutil.net_io_counters(pernic=True, nowrap=False).items()}
+
+
+net_rate_sampler = counters.CounterSampler(read_net_counters, (counters.LONG_BITS,) * 6)
+
+# network rate metric -> (icon, name, unit, device_class)
+NET_RATE_SENSORS = {
+    "rx_rate": ("mdi:download-network", "Receive", "B/s", "data_rate"),
+    "tx_rate": ("mdi:upload-network", "Transmit", "B/s", "data_rate"),
+    "rx_packets": ("mdi:download-network-outline", "Packets Received", "p/s", None),
+    "tx_packets": ("mdi:upload-network-outline", "Packets Sent", "p/s", None),
+    "errors": ("mdi:alert-circle-outline", "Errors", "p/s", None),
+    "drops": ("mdi:delete-outline", "Drops", "p/s", None),
+}
+
+
+def check_net_rates():
+    """{interface: {rx_rate, tx_rate, rx_packets, tx_packets, errors, drops}}
+    per second since the previous call, for the interfaces matching
+    net_interfaces (names or patterns; default every interface but lo)."""
+    patterns = getattr(config, "net_interfaces", []) or []
+    elapsed, deltas = net_rate_sampler.deltas()
+    rates = {}
+    for nic, delta in sorted(deltas.items()):
+        if patterns:
+            if not any(fnmatch.fnmatch(nic, p) for p in patterns):
+                continue
+        elif nic == "lo":
+            continue
+        if elapsed > 0:
+            rates[_slugify(nic)] = {metric: round(value / elapsed, 1) if "rate" not in metric else round(value / elapsed)
+                                    for metric, value in zip(NET_RATE_SENSORS, delta)}
+    return rates
+
+
+def net_rate_entities(rates):
+    """(key, device, value) of the network rate sensors: net_<interface>_<metric>."""
+    for nic, metrics in (rates or {}).items():
+        for metric, value in metrics.items():
+            yield "net_{}_{}".format(nic, metric), nic, value
+
+
 def gather_and_send_info():
-    while not stop_event.is_set():       
-        monitored_values = collect_monitored_values()
-
-        if hasattr(config, 'random_delay'):
-            time.sleep(config.random_delay)
-
-        if args.display:
-            print_measured_values(monitored_values)
-
-        # write some output to a file
-        if config.output_filename:
-            # the only options are "a" for append or "w" for (over)write
-            # check if one of this options is defined
-            if config.output_mode not in ["a", "w"]:
-                print("Error, output_type not known. Default w is set.")
-                config.output_type = "w"
-            try:
-                # open the text file
-                output_file = open(config.output_filename, config.output_mode)
-                # read what should be written into the textfile
-                # we need to define this is a function, otherwise the values are not updated and default values are taken
-                output_content = config.get_content_outputfile()
-                output_file.write(output_content)
-                output_file.close()
-            except Exception as e:
-                print("Error writing to output file:", e)
+    """One collect / publish cycle: a cron run, -d, or one turn of the service's
+    cycle task (see service_main())."""
+    global cycle_spawns
+    cycle_started = time.monotonic()
+    spawn_count(reset=True)
+    # monitored_values: the latest value of everything; due_values and
+    # heartbeat_values: what to publish now (see CollectorScheduler)
+    monitored_values, due_values, heartbeat_values = collector_scheduler.collect(build_collectors())
+    cycle_spawns = spawn_count()
+    if not args.display:
+        record_history(monitored_values)
+    update_metrics(monitored_values)
+
+    if hasattr(config, 'random_delay'):
+        time.sleep(config.random_delay)
+
+    if args.display:
+        print_measured_values(monitored_values)
+
+    # write some output to a file
+    if config.output_filename:
+        # the only options are "a" for append or "w" for (over)write
+        # check if one of this options is defined
+        if config.output_mode not in ["a", "w"]:
+            print("Error, output_type not known. Default w is set.")
+            config.output_type = "w"
+        try:
+            # open the text file
+            output_file = open(config.output_filename, config.output_mode)
+            # read what should be written into the textfile
+            # we need to define this is a function, otherwise the values are not updated and default values are taken
+            output_content = config.get_content_outputfile()
+            output_file.write(output_content)
+            output_file.close()
+        except Exception as e:
+            print("Error writing to output file:", e)
 
-        if args.hass_api:
-            if config.hass_host != "your_hass_host" and config.hass_token != "your_hass_token":
-                publish_to_hass_api(monitored_values)
-            else:
-                print("Error: Home Assistant API host or token not configured.")
-                sys.exit(1) 
+    publish_started = time.monotonic()
+    if args.hass_api:
+        if config.hass_host != "your_hass_host" and config.hass_token != "your_hass_token":
+            publish_to_hass_api(due_values, heartbeat_values)
         else:
-            if config.mqtt_host != "ip address or host":
-                if hasattr(config, 'group_messages') and config.group_messages:
-                    bulk_publish_to_mqtt(monitored_values)
-                else:
-                    publish_to_mqtt(monitored_values)
+            print("Error: Home Assistant API host or token not configured.")
+            sys.exit(1) 
+    else:
+        if config.mqtt_host != "ip address or host":
+            if hasattr(config, 'group_messages') and config.group_messages:
+                bulk_publish_to_mqtt(monitored_values)
             else:
-                pass
-        if not args.service:
-            break
-        # Break the sleep into 1-second intervals and check stop_event after each interval
-        for _ in range(config.service_sleep_time):
-            if stop_event.is_set():
-                break
-            time.sleep(1)
-
-
-def update_status():
-    while not stop_event.is_set():
-        git_update = check_git_update(script_dir)
-        # only run `sudo apt update` when the feature is enabled; otherwise it
-        # fires every update_check_interval and can trigger sudo mail to root
-        apt_updates = get_apt_updates() if config.apt_updates else None
-        publish_update_status_to_mqtt(git_update, apt_updates)
-        stop_event.wait(config.update_check_interval)
-        if stop_event.is_set():
-            break
+                publish_to_mqtt(due_values, heartbeat_values)
+        else:
+            pass
+    finished = time.monotonic()
+    record_cycle(finished - cycle_started, finished - publish_started, spawn_count())
+
+
+def publish_update_status():
+    """Check for a new release (and apt updates) and publish the result."""
+    git_update = check_git_update(script_dir)
+    # only run `sudo apt update` when the feature is enabled; otherwise it
+    # fires every update_check_interval and can trigger sudo mail to root
+    apt_updates = get_apt_updates() if config.apt_updates else None
+    publish_update_status_to_mqtt(git_update, apt_updates)
+
+
+def daemon_map(func, items, workers):
+    """list(map(func, items)) on up to workers daemon threads. Unlike a
+    ThreadPoolExecutor's workers, which the interpreter joins at exit, a hung
+    smartctl or HTTP request cannot keep the stopped service alive. The first
+    exception raised by func is re-raised once every item is done."""
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    lock = threading.Lock()
+    pending = iter(enumerate(items))
+
+    def work():
+        while True:
+            with lock:
+                try:
+                    i, item = next(pending)
+                except StopIteration:
+                    return
+            try:
+                results[i] = func(item)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work, name="worker", daemon=True) for _ in range(min(max(1, workers), len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def run_blocking(func, *args):
+    """Run func(*args) in a daemon thread and return an asyncio future for its
+    result. Daemon threads, unlike the default executor's, never hold up the
+    exit once the service has stopped; a SystemExit stops the service."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(method, value):
+        if not future.done():
+            method(value)
+
+    def run():
+        try:
+            result = func(*args)
+        except SystemExit:
+            loop.call_soon_threadsafe(service_stop.set)
+            result = None
+        except Exception as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+            return
+        loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    threading.Thread(target=run, name=getattr(func, "__name__", "blocking"), daemon=True).start()
+    return future
+
+
+async def _cycle_task():
+    """Collect and publish, then sleep until the next collector is due. A Home
+    Assistant birth message (service_refresh) cuts the sleep short and has
+    every value published again."""
+    while True:
+        try:
+            await run_blocking(gather_and_send_info)
+        except Exception as e:
+            print("Error in collect / publish cycle:", e)
+        timeout = max(0, collector_scheduler.next_due() - time.monotonic())
+        try:
+            await asyncio.wait_for(service_refresh.wait(), timeout)
+            collector_scheduler.republish_all()
+        except asyncio.TimeoutError:
+            pass
+        service_refresh.clear()
+
+
+async def _update_task():
+    while True:
+        try:
+            await run_blocking(publish_update_status)
+        except Exception as e:
+            print("Error checking for updates:", e)
+        await asyncio.sleep(config.update_check_interval)
+
+
+async def _command_task():
+    """Run the queued MQTT commands one after another."""
+    while True:
+        client, command = await command_queue.get()
+        try:
+            await run_blocking(handle_command, client, command)
+        except Exception as e:
+            print("Error running command '{}': {}".format(command, e))
+
+
+async def service_main(on_connect=None):
+    """--service core. One event loop runs the collect / publish cycle, the
+    update checker and the MQTT command handler as tasks; blocking work runs in
+    threads (run_blocking()). Between cycles nothing polls: the loop sleeps until
+    a collector is due, a message or hotplug event arrives or a signal is caught.
+    SIGTERM / SIGINT stop it right away, SIGHUP re-probes the device facts.
+    With on_connect the persistent MQTT client is created here, once the loop
+    its messages are handed to exists."""
+    global service_loop, service_stop, service_refresh, command_queue, mqtt_client
+    service_loop = asyncio.get_running_loop()
+    service_stop = asyncio.Event()
+    service_refresh = asyncio.Event()
+    command_queue = asyncio.Queue(COMMAND_QUEUE_SIZE)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        service_loop.add_signal_handler(signum, service_stop.set)
+    # `systemctl kill -s HUP rpi-mqtt-monitor` re-probes model, OS, MAC, ...
+    service_loop.add_signal_handler(signal.SIGHUP, invalidate_device_facts)
+
+    if on_connect is not None:
+        # The same connection also carries the periodic publishes, see mqtt_session().
+        mqtt_client = create_service_mqtt_client(on_connect)
+    sysfs_index.start_watcher(service_loop)
+    tasks = [asyncio.create_task(_cycle_task())]
+    if not args.hass_api:
+        tasks.append(asyncio.create_task(_command_task()))
+        if config.update:
+            tasks.append(asyncio.create_task(_update_task()))
+    try:
+        await service_stop.wait()
+    finally:
+        print("Stopping...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stop_event.set()  # background samplers and readers
+        intel_gpu_reader.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if mqtt_client is not None:
+            mqtt_client.loop_stop()
 
 
 def uninstall_script():
@@ -1820,8 +3923,28 @@ def run_custom_script(script_path):
 
 
 def on_message(client, userdata, msg):
-    global exit_flag, thread1, thread2
-    command = msg.payload.decode()
+    """paho callback (network thread): hand the message to the service loop,
+    which runs commands one at a time off the network thread."""
+    if msg.topic == ha_status_topic:
+        # Home Assistant birth message: it has (re)started and forgotten every
+        # discovered entity, so republish the discovery configs and every value
+        # (past the publish_on_change filter) right away.
+        if msg.payload.decode() == "online":
+            reset_discovery_cache()
+            reset_publish_filter()
+            service_loop.call_soon_threadsafe(service_refresh.set)
+        return
+    service_loop.call_soon_threadsafe(_queue_command, client, msg.payload.decode())
+
+
+def _queue_command(client, command):
+    try:
+        command_queue.put_nowait((client, command))
+    except asyncio.QueueFull:
+        print("Ignored '{}': {} commands are already waiting.".format(command, command_queue.qsize()))
+
+
+def handle_command(client, command):
     print("Received message: ", command)
 
     # Map each command to the config flag that must be enabled for it to run,
@@ -1852,19 +3975,11 @@ def on_message(client, userdata, msg):
                 publish_update_progress(client, False, version, None)
                 return
             publish_update_progress(client, True, version, 100)
-            print("Update completed. Stopping MQTT client loop...")
-            client.loop_stop()  # Stop the MQTT client loop
-            print("Setting exit flag...")
-            exit_flag = True
-            stop_event.set()  # Signal the threads to stop
-            if thread1 is not None:
-                thread1.join()  # Wait for thread1 to finish
-            if thread2 is not None:
-                thread2.join()  # Wait for thread2 to finish
-            os._exit(0)  # Exit the script immediately
-
-        update_thread = threading.Thread(target=update_and_exit)
-        update_thread.start()
+            # systemd (Restart=always) starts the new version
+            print("Update completed. Stopping the service...")
+            service_loop.call_soon_threadsafe(service_stop.set)
+
+        update_and_exit()
     elif command in ("restart", "shutdown"):
         # systemctl reboot/poweroff honor logind "block" inhibitors (GNOME always holds
         # a session shutdown lock on Ubuntu Desktop), so plain `reboot`/`shutdown` are
@@ -1889,10 +4004,18 @@ def on_message(client, userdata, msg):
             print("Running custom script for payload: " + command)
             run_custom_script(scripts[command])
 
-exit_flag = False
-thread1 = None
-thread2 = None
+mqtt_client = None
+# processes launched by the last collect_monitored_values() run, see spawn_count()
+cycle_spawns = None
+# set on shutdown; background sampler and reader threads watch it
 stop_event = threading.Event()
+# --service event loop and its events, see service_main()
+service_loop = None
+service_stop = None
+service_refresh = None
+command_queue = None
+# commands waiting beyond this are dropped (a retained or repeated payload flood)
+COMMAND_QUEUE_SIZE = 8
 script_dir = os.path.dirname(os.path.realpath(__file__))
 # get device host name - used in mqtt topic
 # and adhere to the allowed character set
@@ -1901,6 +4024,9 @@ if hasattr(config, 'ha_device_name') and config.ha_device_name:
 else:
     hostname = re.sub(r'[^a-zA-Z0-9_-]', '_', socket.gethostname())
 
+# Home Assistant publishes "online" here when it starts (MQTT birth message)
+ha_status_topic = config.mqtt_discovery_prefix + "/status"
+
 if __name__ == '__main__':
     args = parse_arguments();
 
@@ -1922,41 +4048,27 @@ if __name__ == '__main__':
                     print("Error: Unable to connect to MQTT broker, return code:", rc)
                     return
                 client.subscribe(command_topic)
-                client.publish(status_topic, "1", qos=config.qos, retain=config.retain)
+                client.subscribe(ha_status_topic)
+                mqtt_publish(client, status_topic, "1", retain=config.retain)
+                # a new session may be a restarted broker without persistence:
+                # send every discovery config and value again on the next cycle
+                reset_discovery_cache()
+                reset_publish_filter()
                 print("Listening to topic : " + command_topic)
 
-            client = paho.Client(transport=mqtt_transport())
-            client.username_pw_set(config.mqtt_user, config.mqtt_password)
-            configure_mqtt_connection(client)
-            client.on_message = on_message
-            client.on_connect = on_service_connect
-            # set will_set to send a message when the client disconnects
-            client.will_set(status_topic, "0", qos=config.qos, retain=config.retain)
-            # connect_async + loop_start so the service keeps retrying if the
-            # broker is not yet reachable at boot (covered by systemd Restart too).
-            client.connect_async(config.mqtt_host, int(config.mqtt_port))
-            client.loop_start()
-
-
-        thread1 = threading.Thread(target=gather_and_send_info)
-        thread1.daemon = True  # Set thread1 as a daemon thread
-        thread1.start()
-
-        if not args.hass_api:
-            if config.update:
-                thread2 = threading.Thread(target=update_status)
-                thread2.daemon = True  # Set thread2 as a daemon thread
-                thread2.start()
-
-        try:
-            while True:
-                time.sleep(1)  # Check the exit flag every second
-        except KeyboardInterrupt:
-            print(" Ctrl+C pressed. Setting exit flag...")
-            if not args.hass_api:
-                client.loop_stop()
-            exit_flag = True
-            stop_event.set()  # Signal the threads to stop
-            sys.exit(0)  # Exit the script
+        if getattr(config, "prometheus_exporter", False):
+            try:
+                metrics_server = exporter.MetricsServer(getattr(config, "prometheus_address", "0.0.0.0"),
+                                                        getattr(config, "prometheus_port", 9110))
+                metrics_server.start()
+            except OSError as e:
+                print("Error starting the Prometheus endpoint:", e)
+        if getattr(config, "fast_sampling", False):
+            fast_sampler.start()
+        if any(getattr(config, k, False) for k in ("intel_gpu_render", "intel_gpu_video", "intel_gpu_freq", "intel_gpu_power")):
+            intel_gpu_reader.start()
+
+        asyncio.run(service_main(None if args.hass_api else on_service_connect))
+        sys.exit(0)
     else:
         gather_and_send_info()
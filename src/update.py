@@ -5,6 +5,40 @@ import config
 import sys
 
 
+# Device facts cache written by rpi-cpu2mqtt.py (model, OS, MAC, git version)
+DEVICE_FACTS_FILE = 'device_facts.json'
+
+
+def device_facts_path(script_dir):
+    return os.path.join(script_dir, DEVICE_FACTS_FILE)
+
+
+# Last SMART readings per drive, shared by service and cron runs
+SMART_CACHE_FILE = 'smart_cache.json'
+
+
+def smart_cache_path(script_dir):
+    return os.path.join(script_dir, SMART_CACHE_FILE)
+
+
+# Latest release seen by the last update check (version and release notes)
+REMOTE_RELEASE_FILE = 'remote_release.json'
+
+
+def remote_release_path(script_dir):
+    return os.path.join(script_dir, REMOTE_RELEASE_FILE)
+
+
+def invalidate_device_facts(script_dir):
+    """Delete the device facts cache so the next run probes them again."""
+    try:
+        os.remove(device_facts_path(script_dir))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print("Warning: could not remove device facts cache: {}".format(e))
+
+
 def safe_literal_eval(node):
     try:
         return ast.literal_eval(node)
@@ -163,6 +197,8 @@ def do_update(script_dir, version=config.version, git_update=True, config_update
     if version != config.version:
         update_config_version(version, script_dir)
 
+    # the new version may report the device differently
+    invalidate_device_facts(script_dir)
     report(90)
     return True
 
@@ -0,0 +1,34 @@
+import counters
+from counters import CounterSampler, counter_delta
+
+
+def test_increase():
+    assert counter_delta(100, 250, 64) == 150
+    assert counter_delta(100, 250, 32) == 150
+
+
+def test_32bit_wrap():
+    assert counter_delta(2 ** 32 - 10, 5, 32) == 15
+
+
+def test_32bit_reset():
+    assert counter_delta(1000, 10, 32) == 0
+
+
+def test_64bit_reset():
+    # a value between 2^31 and 2^32 is no reason to assume a wrap
+    assert counter_delta(3 * 2 ** 30, 10, 64) == 0
+    assert counter_delta(2 ** 40, 10, 64) == 0
+
+
+def test_interface_reset(monkeypatch):
+    # bytes and packets of a NIC that was re-plugged before the third reading
+    monkeypatch.setattr(counters.time, "sleep", lambda seconds: None)
+    readings = iter([
+        {"eth0": (3 * 2 ** 30, 2 ** 20)},
+        {"eth0": (3 * 2 ** 30 + 1000, 2 ** 20 + 10)},
+        {"eth0": (4096, 2 ** 20 + 512)},
+    ])
+    sampler = CounterSampler(lambda: next(readings), (64, 64))
+    assert sampler.deltas()[1] == {"eth0": (1000, 10)}
+    assert sampler.deltas()[1] == {"eth0": (0, 502)}
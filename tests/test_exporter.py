@@ -0,0 +1,17 @@
+from exporter import render
+
+
+def test_render_numeric_strings():
+    text = render({
+        "rpi_voltage": ("gauge", "voltage", [({}, "0.8563")]),
+        "rpi_rpi5_fan_speed": ("gauge", "fan speed", [({}, "2310")]),
+        "rpi_ext_sensor_temp": ("gauge", "temperature", [({"sensor": "attic"}, "21.5")]),
+        "rpi_git_update": ("gauge", "git update", [({}, "off")]),
+        "rpi_cpu_load": ("gauge", "cpu load", [({}, 12)]),
+    })
+    assert "rpi_voltage 0.8563\n" in text
+    assert "rpi_rpi5_fan_speed 2310.0\n" in text
+    assert 'rpi_ext_sensor_temp{sensor="attic"} 21.5\n' in text
+    assert "rpi_cpu_load 12\n" in text
+    assert "rpi_git_update" not in text
+    assert text.endswith("# EOF\n")
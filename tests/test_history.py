@@ -0,0 +1,13 @@
+from history import History
+
+
+def test_record_numeric_strings(tmp_path):
+    history = History(str(tmp_path))
+    history.record({"voltage": "0.8563", "rpi5_fan_speed": "2310", "cpu_load": 12.5,
+                    "git_update": "off", "uptime": "3 days", "status": True, "cpu_temp": "nan"}, now=120)
+    assert history.buckets("voltage", "1m", 1, now=120) == [(0.8563, 0.8563, 0.8563, 1)]
+    assert history.buckets("rpi5_fan_speed", "1m", 1, now=120) == [(2310.0, 2310.0, 2310.0, 1)]
+    assert history.buckets("cpu_load", "1m", 1, now=120) == [(12.5, 12.5, 12.5, 1)]
+    for metric in ("git_update", "uptime", "status", "cpu_temp"):
+        assert not history.has(metric)
+    history.close()